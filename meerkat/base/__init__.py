@@ -14,6 +14,7 @@ if sys.platform == 'linux':
     import json
     import time
     import struct
+    import asyncio
 
     from meerkat import i2c_pi
 
@@ -35,6 +36,11 @@ elif sys.platform in ['FiPy']:
     import utime as time
     import ustruct as struct
 
+    try:
+        import uasyncio as asyncio
+    except ImportError:
+        asyncio = None
+
     from meerkat import i2c_pycom
 
     I2C = i2c_pycom.WrapI2C
@@ -53,6 +59,11 @@ elif sys.platform in ['Espressif', 'RP2040']:
     import time
     import struct
 
+    try:
+        import asyncio
+    except ImportError:
+        asyncio = None
+
     from meerkat.base import i2c_circuitpython
 
     I2C = i2c_circuitpython.WrapI2C
@@ -72,6 +83,11 @@ elif sys.platform in ['pyboard', 'OpenMV3-M7']:
     import utime as time
     import ustruct as struct
 
+    try:
+        import uasyncio as asyncio
+    except ImportError:
+        asyncio = None
+
     from meerkat import i2c_pyboard
 
     I2C = i2c_pyboard.WrapI2C
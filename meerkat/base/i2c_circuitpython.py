@@ -172,6 +172,19 @@ class WrapI2CBase:
         self.bus.unlock()
         return buff
 
+    def read_register_into(self, reg_addr, buf):
+        """Read len(buf) bytes starting at a register into buf
+
+        Parameters
+        ----------
+        reg_addr : int, registry internal to the Target device to read
+        buf : bytearray, destination of bytes read
+        """
+        while not self.bus.try_lock():
+            time.sleep(0)
+        self.bus.writeto_then_readfrom(self.bus_addr, bytes([reg_addr]), buf)
+        self.bus.unlock()
+
 
 class WrapI2C(WrapI2CBase):
 
@@ -1,11 +1,69 @@
 """Wrapper Library for controlling I2C devices connected to Raspberry Pi (Linux)
 Tested with Raspberry Pi 4"""
 
+import threading
+
 from meerkat import i2c_quickwire
 
 
+# one shared controller per bus number, see shared_controller
+_shared_controllers = {}
+_shared_lock = threading.Lock()
+
+
+def shared_controller(bus_n, coalesce=False):
+    """Get the I2C controller shared by all devices on a bus, opening
+    the bus device on first use.  Transactions are serialized with a lock
+    so devices can be used from multiple threads.
+
+    Parameters
+    ----------
+    bus_n : int, i2c bus number
+    coalesce : bool, if True, queue transactions submitted while another
+        is in progress and run them in one I2C_RDWR ioctl where the adapter
+        allows it, see i2c_quickwire.SharedI2CController. Only used when
+        the controller is first created.
+
+    Returns
+    -------
+    i2c_quickwire.SharedI2CController instance
+    """
+    with _shared_lock:
+        controller = _shared_controllers.get(bus_n)
+        if controller is None:
+            controller = i2c_quickwire.SharedI2CController(n=bus_n, coalesce=coalesce)
+            _shared_controllers[bus_n] = controller
+        return controller
+
+
+def shared_device(bus_n, bus_addr, coalesce=False):
+    """Get a device handle that uses the shared controller for a bus,
+    see shared_controller
+
+    Parameters
+    ----------
+    bus_n : int, i2c bus connected to Target devices
+    bus_addr : hex, address of Target device on i2c bus
+    coalesce : bool, see shared_controller
+
+    Returns
+    -------
+    WrapI2C instance
+    """
+    return WrapI2C(bus_n, bus_addr,
+                   controller=shared_controller(bus_n, coalesce=coalesce))
+
+
+def close_shared(bus_n):
+    """Close the shared controller for a bus"""
+    with _shared_lock:
+        controller = _shared_controllers.pop(bus_n, None)
+    if controller is not None:
+        controller.close()
+
+
 class WrapI2C:
-    def __init__(self, bus_n, bus_addr):
+    def __init__(self, bus_n, bus_addr, controller=None):
         """Set the I2C communications to the Target device specified by
         the address
 
@@ -13,24 +71,37 @@ class WrapI2C:
         ----------
         bus_n : int, i2c bus connected to Target devices
         bus_addr : hex, address of Target device on i2c bus
-        #
-        #
+        controller : i2c_quickwire.I2CController, optional, controller to
+            use instead of opening the bus device, see shared_device
         """
-        self.bus = i2c_quickwire.I2CController(n=bus_n)
+        if controller is None:
+            controller = i2c_quickwire.I2CController(n=bus_n)
+        self.bus = controller
+        self.bus_n = bus_n
         self.bus_addr = bus_addr
 
-    def scan(self):
-        """Scan I2C bus for devices
+        # transactions built on the caller's buffer, keyed by
+        # (bus_addr, reg_addr, n), see read_register_into
+        self._transactions = {}
+
+    def scan(self, first=0x08, last=0x77, timeout=None):
+        """Scan the I2C bus this instance is on for devices.  Each address
+        is probed with a quick write, or a one byte read in the ranges
+        i2cdetect reads, see i2c_quickwire.probe_read_ranges
+
+        Parameters
+        ----------
+        first : int, lowest address to probe
+        last : int, highest address to probe
+        timeout : float, optional, seconds to wait on each probe.  Sets
+            the adapter timeout, which is set back to
+            i2c_quickwire.default_timeout after the scan.
 
         Returns
         -------
-        list of addresses found, in hex notation
+        list of int addresses found
         """
-        import subprocess
-        bash_command = "i2cdetect -y 1"
-        process = subprocess.Popen(bash_command.split(), stdout=subprocess.PIPE)
-        output, error = process.communicate()
-        return ["0x"+a.decode() for a in output.split()[16:] if (b":" not in a) and (a != b"--")]
+        return self.bus.scan(first=first, last=last, timeout=timeout)
 
     def read_n_bytes(self, n, flip_MSB=True):
         """Read bytes (n total) from Target device, handle MSB flip behavior
@@ -137,5 +208,25 @@ class WrapI2C:
         -------
         n bit values
         """
-        self.bus.write_bytes(self.bus_addr, reg_addr)
-        return self.bus.get(self.bus_addr, n)[0]
+        # the register pointer write is safe to send again
+        return self.bus.write_then_read(self.bus_addr, [reg_addr], n, idempotent=True)[0]
+
+    def read_register_into(self, reg_addr, buf):
+        """Read len(buf) bytes starting at a register into buf.  The read
+        message is built on buf itself, so no bytes are copied, and it is
+        reused while the same buf is passed for the same register and
+        length, so repeated reads do not allocate.  For reads of varying
+        length keep one buf, i.e. a memoryview, per length.
+
+        Parameters
+        ----------
+        reg_addr : int, registry internal to the Target device to read
+        buf : bytearray or writable memoryview, destination of bytes read
+        """
+        key = (self.bus_addr, reg_addr, len(buf))
+        txn = self._transactions.get(key)
+        if (txn is None) or (txn.buffer is not buf):
+            txn = i2c_quickwire.I2CTransaction(self.bus_addr, len(buf),
+                                               register=[reg_addr], buf=buf)
+            self._transactions[key] = txn
+        self.bus.execute(txn)
@@ -77,9 +77,15 @@ I2C_WORKER_FORCE = 0x0706    # Change Target address
 I2C_TENBIT  = 0x0704    # 0 for 7 bit addrs, != 0 for 10 bit
 I2C_FUNCS   = 0x0705    # Get the adapter functionality
 I2C_RDWR    = 0x0707    # Combined R/W transfer (one stop only)
+I2C_TIMEOUT = 0x0702    # Adapter timeout, in units of 10 ms
+
+I2C_RDWR_IOCTL_MAX_MSGS = 42  # kernel limit of messages per I2C_RDWR
 
 import sys
+import errno
 import time
+import random
+import threading
 from contextlib import closing
 import posix
 from fcntl import ioctl
@@ -99,6 +105,50 @@ def revision():
 
 default_bus = 1 if revision() > 1 else 0
 
+# address ranges probed with a read instead of a quick write, as i2cdetect
+# does, since a quick write can corrupt some EEPROMs or latch a register
+probe_read_ranges = [(0x30, 0x37), (0x50, 0x5F)]
+
+# seconds, the adapter timeout the kernel sets for adapters that do not set
+# their own (HZ jiffies).  I2C_TIMEOUT can not be read back, so scan restores
+# this value after a scan with a timeout.
+default_timeout = 1.0
+
+
+class RetryPolicy(object):
+    """How an I2CController retries a failed I2C_RDWR ioctl.
+
+    The wait before retry k (1, 2, ...) is
+        min(backoff * multiplier**(k-1), backoff_max)
+    randomly scaled by +/- jitter, so devices contending for the bus
+    do not retry in lock step.  No retry is started that would end
+    after deadline seconds from the first failure.
+    """
+
+    def __init__(self, max_attempts=4, backoff=0.0005, multiplier=4,
+                 backoff_max=0.05, jitter=0.25, deadline=0.1):
+        """
+        Arguments:
+        max_attempts -- total attempts including the first (default 4).
+        backoff      -- seconds to wait before the first retry (default 0.5 ms).
+        multiplier   -- wait growth factor per retry (default 4).
+        backoff_max  -- maximum seconds to wait before a retry (default 50 ms).
+        jitter       -- fraction the wait is randomly varied by (default 0.25).
+        deadline     -- maximum seconds spent retrying one transaction,
+                        None for no limit (default 100 ms).
+        """
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.multiplier = multiplier
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.deadline = deadline
+
+    def wait(self, retry):
+        """Seconds to wait before retry number retry, starting at 1"""
+        w = min(self.backoff * self.multiplier ** (retry - 1), self.backoff_max)
+        return w * (1 + self.jitter * (2 * random.random() - 1))
+
 
 class I2CController(object):
     """Performs I2C I/O transactions on an I2C bus.
@@ -122,7 +172,7 @@ class I2CController(object):
                 writing(0x20, bytes([0x01, 0xFF])))
     """
 
-    def __init__(self, n=default_bus, extra_open_flags=0):
+    def __init__(self, n=default_bus, extra_open_flags=0, retry=None):
         """Opens the bus device.
 
         Arguments:
@@ -132,8 +182,17 @@ class I2CController(object):
         extra_open_flags -- extra flags passed to posix.open when
                             opening the I2C bus device file (default 0;
                             e.g. no extra flags).
+        retry            -- RetryPolicy for failed transactions (default
+                            None; e.g. RetryPolicy()).
         """
         self.fd = posix.open("/dev/i2c-%i"%n, posix.O_RDWR|extra_open_flags)
+        self.retry = RetryPolicy() if retry is None else retry
+
+        # per Target address counts of retried and failed transactions.  A
+        # coalesced SharedI2CController batch is not counted, only the
+        # transactions that are run again on their own after it fails.
+        self.retries = {}
+        self.failures = {}
 
     def __enter__(self):
         return self
@@ -147,13 +206,16 @@ class I2CController(object):
         """
         posix.close(self.fd)
 
-    def transaction(self, *msgs):
+    def transaction(self, *msgs, idempotent=False):
         """
         Perform an I2C I/O transaction.
 
         Arguments:
-        *msgs -- I2C messages created by one of the reading, reading_into,
-                 writing or writing_bytes functions.
+        *msgs      -- I2C messages created by one of the reading, reading_into,
+                      writing or writing_bytes functions.
+        idempotent -- True if the writes can safely be sent twice, i.e. a
+                      register pointer (default False).  Only used by
+                      SharedI2CController.
 
         Returns: a list of byte sequences, one for each read operation
                  performed.
@@ -162,14 +224,116 @@ class I2CController(object):
         msg_count = len(msgs)
         msg_array = (i2c_msg*msg_count)(*msgs)
         ioctl_arg = i2c_rdwr_ioctl_data(msgs=msg_array, nmsgs=msg_count)
-        
+
+        self._rdwr(ioctl_arg)
+
+        return [i2c_msg_to_bytes(m) for m in msgs if (m.flags & I2C_M_RD)]
+
+    def execute(self, txn):
+        """
+        Perform a pre-allocated I2C I/O transaction.
+
+        Arguments:
+        txn -- I2CTransaction instance, reused across calls
+
+        Returns: memoryview of the bytes read, valid until the next call
+                 to execute with the same transaction.
+        """
+        self._rdwr(txn.ioctl_arg)
+        return txn.view
+
+    def _rdwr(self, ioctl_arg):
+        """Run an I2C_RDWR ioctl, retrying as set by self.retry"""
         try:
             ioctl(self.fd, I2C_RDWR, ioctl_arg)
-        except OSError:
-            time.sleep(0.5)  # if the bus has an error, wait and try again
+            return
+        except OSError as e:
+            error = e
+
+        policy = self.retry
+        addrs = set([ioctl_arg.msgs[i].addr for i in range(ioctl_arg.nmsgs)])
+        t0 = time.monotonic()
+        for retry in range(1, policy.max_attempts):
+            w = policy.wait(retry)
+            if ((policy.deadline is not None) and
+                    (time.monotonic() - t0 + w > policy.deadline)):
+                break
+            time.sleep(w)
+            for addr in addrs:
+                self.retries[addr] = self.retries.get(addr, 0) + 1
+            try:
+                ioctl(self.fd, I2C_RDWR, ioctl_arg)
+                return
+            except OSError as e:
+                error = e
+
+        for addr in addrs:
+            self.failures[addr] = self.failures.get(addr, 0) + 1
+        raise error
+
+    def set_timeout(self, timeout):
+        """
+        Set the adapter timeout for each transfer.
+
+        Arguments:
+        timeout -- seconds, rounded up to units of 10 ms.  This applies to
+                   the whole adapter, not only this instance, until it
+                   is set again.  The current value can not be read, see
+                   default_timeout.
+        """
+        ioctl(self.fd, I2C_TIMEOUT, max(1, int(timeout * 100 + 0.999)))
+
+    def probe(self, addr, read=None):
+        """
+        Check if a Target device acknowledges its address.  The probe is
+        tried once, it is not retried as set by self.retry.
+
+        Arguments:
+        addr -- 7 bit Target address
+        read -- True to probe with a one byte read, False with a quick
+                write of no data (default None; e.g. as i2cdetect does,
+                see probe_read_ranges).
+
+        Returns: True if the address was acknowledged.
+        """
+        if read is None:
+            read = any(lo <= addr <= hi for lo, hi in probe_read_ranges)
+        if read:
+            msg = reading(addr, 1)
+        else:
+            msg = i2c_msg(addr=addr, flags=0, len=0, buf=None)
+        ioctl_arg = i2c_rdwr_ioctl_data(msgs=pointer(msg), nmsgs=1)
+        try:
             ioctl(self.fd, I2C_RDWR, ioctl_arg)
-            
-        return [i2c_msg_to_bytes(m) for m in msgs if (m.flags & I2C_M_RD)]
+            return True
+        except OSError:
+            return False
+
+    def scan(self, first=0x08, last=0x77, timeout=None, read=None):
+        """
+        Scan the bus for Target devices.
+
+        Arguments:
+        first   -- lowest address to probe (default 0x08).
+        last    -- highest address to probe (default 0x77).
+        timeout -- seconds to wait on each probe, see set_timeout
+                   (default None; e.g. the adapter timeout is unchanged).
+                   The timeout applies to the whole adapter, so after the
+                   scan it is set to default_timeout, not to any value
+                   set before.
+        read    -- probe type passed to probe (default None).
+
+        Returns: a list of int addresses that acknowledged.
+        """
+        if timeout is None:
+            return [addr for addr in range(first, last + 1)
+                    if self.probe(addr, read=read)]
+        self.set_timeout(timeout)
+        try:
+            return [addr for addr in range(first, last + 1)
+                    if self.probe(addr, read=read)]
+        finally:
+            self.set_timeout(default_timeout)
 
     def get(self, addr, n_bytes):
         return self.transaction(reading(addr,n_bytes))
@@ -183,6 +347,172 @@ class I2CController(object):
     def write_bytes(self, addr, *bytes):
         return self.transaction(writing_bytes(addr, *bytes))
 
+    def write_then_read(self, addr, byte_seq, n_bytes, idempotent=False):
+        """Write byte_seq then read n_bytes in one combined transaction,
+        with a repeated start between the two messages.  See transaction
+        for idempotent."""
+        return self.transaction(writing(addr, byte_seq), reading(addr, n_bytes),
+                                idempotent=idempotent)
+
+
+
+class SharedI2CController(I2CController):
+    """An I2CController that can be shared by many devices and threads.
+
+    Every I2C_RDWR ioctl is serialized by a lock.  If coalesce is True,
+    transactions submitted while another is in progress are queued and
+    then run together in one I2C_RDWR ioctl, up to the kernel limit of
+    I2C_RDWR_IOCTL_MAX_MSGS messages.  Many adapters, including the
+    Raspberry Pi i2c-bcm2835, only accept a read as the last message, so
+    queued transactions are only combined while every read is last: any
+    number of write only transactions, optionally followed by one that
+    ends with its only read.
+
+    A combined ioctl is tried once, without retries.  If the adapter
+    rejects it (EOPNOTSUPP or EINVAL) nothing was sent, coalesce is set to
+    False and each transaction is run again on its own.  After any other
+    error some writes may already have reached the bus, so only
+    transactions without writes, or submitted with idempotent=True, are
+    run again.  The others are given the error of the combined ioctl.
+    Transactions run on their own are retried as set by self.retry.
+    """
+
+    def __init__(self, n=default_bus, extra_open_flags=0, retry=None,
+                 coalesce=False):
+        super().__init__(n=n, extra_open_flags=extra_open_flags, retry=retry)
+        self.coalesce = coalesce
+        self.lock = threading.Lock()
+        self._pending = []  # queued [msgs, result, error, idempotent] requests
+        self._pending_lock = threading.Lock()
+
+    def _rdwr(self, ioctl_arg):
+        with self.lock:
+            super()._rdwr(ioctl_arg)
+
+    def probe(self, addr, read=None):
+        with self.lock:
+            return super().probe(addr, read=read)
+
+    def transaction(self, *msgs, idempotent=False):
+        if not self.coalesce:
+            return super().transaction(*msgs)
+
+        request = [msgs, None, None, idempotent]
+        with self._pending_lock:
+            self._pending.append(request)
+
+        with self.lock:
+            # another thread may have run this request while we waited
+            while (request[1] is None) and (request[2] is None):
+                self._run_pending()
+
+        if request[2] is not None:
+            raise request[2]
+        return request[1]
+
+    def _run_pending(self):
+        """Run queued requests in one ioctl, lock must be held"""
+        with self._pending_lock:
+            batch = [self._pending.pop(0)]
+            n = len(batch[0][0])
+            # combine while the only read, if any, is the last message
+            open_batch = self.coalesce and not _has_read(batch[0][0])
+            while open_batch and self._pending:
+                msgs = self._pending[0][0]
+                if (n + len(msgs) > I2C_RDWR_IOCTL_MAX_MSGS) or _has_read(msgs[:-1]):
+                    break
+                batch.append(self._pending.pop(0))
+                n += len(msgs)
+                open_batch = not _has_read(msgs)
+
+        try:
+            if len(batch) == 1:
+                self._rdwr_unlocked(batch[0][0])
+            else:
+                self._rdwr_once([m for request in batch for m in request[0]])
+        except OSError as e:
+            if len(batch) == 1:
+                batch[0][2] = e
+                return
+            rejected = e.errno in (errno.EOPNOTSUPP, errno.EINVAL)
+            if rejected:
+                self.coalesce = False
+            for request in batch:
+                if not (rejected or request[3] or not _has_write(request[0])):
+                    request[2] = e
+                    continue
+                try:
+                    self._rdwr_unlocked(request[0])
+                except OSError as e_request:
+                    request[2] = e_request
+        except Exception as e:
+            # release every waiting thread, not only the one running the batch
+            for request in batch:
+                request[2] = e
+            raise
+
+        for request in batch:
+            if request[2] is None:
+                request[1] = [i2c_msg_to_bytes(m) for m in request[0]
+                              if (m.flags & I2C_M_RD)]
+
+    def _rdwr_unlocked(self, msgs):
+        """Run messages in one ioctl with retries, lock must be held"""
+        msg_array = (i2c_msg*len(msgs))(*msgs)
+        ioctl_arg = i2c_rdwr_ioctl_data(msgs=msg_array, nmsgs=len(msgs))
+        I2CController._rdwr(self, ioctl_arg)
+
+    def _rdwr_once(self, msgs):
+        """Run messages in one ioctl without retries or counts, lock
+        must be held"""
+        msg_array = (i2c_msg*len(msgs))(*msgs)
+        ioctl_arg = i2c_rdwr_ioctl_data(msgs=msg_array, nmsgs=len(msgs))
+        ioctl(self.fd, I2C_RDWR, ioctl_arg)
+
+
+class I2CTransaction(object):
+    """A reusable I2C I/O transaction that reads n_bytes from a Target,
+    optionally after writing a register pointer in the same transaction.
+
+    All ctypes structures are allocated once, so repeated calls to
+    I2CController.execute do not allocate.  Data is read directly into
+    buf, which may be a caller supplied bytearray or writable memoryview.
+
+    For example:
+
+        buf = bytearray(14)
+        txn = I2CTransaction(0x68, 14, register=[0x3B], buf=buf)
+        with I2CController() as i2c:
+            i2c.execute(txn)  # buf now holds the 14 bytes read
+    """
+
+    def __init__(self, addr, n_bytes, register=None, buf=None):
+        """
+        Arguments:
+        addr     -- address of the Target device
+        n_bytes  -- number of bytes to read
+        register -- sequence of bytes to write before reading, i.e. a
+                    register address (default None, read only).
+        buf      -- bytearray or writable memoryview of at least n_bytes
+                    to read into (default None, allocate a bytearray).
+        """
+        if buf is None:
+            buf = bytearray(n_bytes)
+        self.addr = addr
+        self.n_bytes = n_bytes
+        self.buffer = buf
+        self.view = memoryview(buf)[:n_bytes]
+
+        # ctypes views of the Python buffers, no data is copied
+        self._read_buf = (c_char * n_bytes).from_buffer(buf)
+        msgs = []
+        if register is not None:
+            self._write_buf = create_string_buffer(bytes(register), len(register))
+            msgs.append(_new_i2c_msg(addr, 0, self._write_buf))
+        msgs.append(_new_i2c_msg(addr, I2C_M_RD, self._read_buf))
+
+        self._msgs = (i2c_msg*len(msgs))(*msgs)
+        self.ioctl_arg = i2c_rdwr_ioctl_data(msgs=self._msgs, nmsgs=len(msgs))
 
 
 def reading(addr, n_bytes):
@@ -209,6 +539,13 @@ def writing(addr, byte_seq):
     return _new_i2c_msg(addr, 0, create_string_buffer(buf, len(buf)))
 
 
+def _has_read(msgs):
+    return any(m.flags & I2C_M_RD for m in msgs)
+
+def _has_write(msgs):
+    return any(not (m.flags & I2C_M_RD) for m in msgs)
+
+
 def _new_i2c_msg(addr, flags, buf):
     return i2c_msg(addr=addr, flags=flags, len=sizeof(buf), buf=buf)
 
@@ -0,0 +1,204 @@
+"""Run several drivers from one loop, each on its own period
+
+Tasks are kept in a heap ordered by the next time they are due.  Times are
+scheduled from the previous due time, not from when the task ran, so
+periods do not drift.  A task with a settle time is split into a start
+call and a read call, and other tasks run while it settles.  An exception
+raised by a task is kept and counted, and the other tasks keep running.
+
+Example, with each driver already configured.  Tasks should not block.
+The BME680 forced measurement is started, then read once its conversion
+time has passed, while the other tasks run.  The SCD4x and SPS30 measure
+continuously, the SCD4x task reads only when new data is ready and the
+SPS30 task reads the latest values:
+
+>>> scd.start_periodic_measurement()
+>>> sps.start_measurement()
+>>> s = Scheduler()
+>>> s.add('mpu', mpu.write, period=0.01)
+>>> s.add('bme', lambda: bme.measure() and [bme.temperature(), bme.pressure(),
+...                                          bme.humidity(), bme.gas()],
+...       period=2, start=bme.forced_mode, settle=bme.conversion_time())
+>>> s.add('scd', scd.poll, period=1)
+>>> s.add('sps', lambda: sps.measured_values(ready=True), period=1)
+>>> s.run(duration=60)
+>>> sps.stop_measurement()
+>>> scd.stop_periodic_measurement()
+>>> s.report()
+"""
+
+try:
+    import heapq
+except ImportError:
+    import uheapq as heapq
+
+from meerkat.base import time
+
+
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class Task:
+    """One periodic job run by Scheduler"""
+    def __init__(self, name, run, period, start=None, settle=0, deadline=None,
+                 callback=None):
+        """
+        Parameters
+        ----------
+        name : str, name used in reports
+        run : callable, reads or records data, return value is kept in
+            self.result and passed to callback
+        period : float, seconds between runs
+        start : callable, optional, starts a measurement, run is called
+            settle seconds later
+        settle : float, seconds between start and run
+        deadline : float, seconds after the due time that run must finish
+            by, defaults to period
+        callback : callable, optional, called with the return value of run
+        """
+        self.name = name
+        self.run = run
+        self.period = period
+        self.start = start
+        self.settle = settle
+        self.deadline = period if deadline is None else deadline
+        self.callback = callback
+
+        self.runs = 0         # completed runs
+        self.missed = 0       # runs finished after their deadline
+        self.skipped = 0      # periods skipped because the task fell behind
+        self.max_late = 0.0   # largest seconds past the deadline
+        self.errors = 0       # runs, starts or callbacks that raised an exception
+        self.error = None     # last exception raised
+        self.result = None    # return value of the last run
+
+
+class Scheduler:
+    """Run Tasks on independent periods from a single heap"""
+    def __init__(self, clock=None, sleep=None):
+        """
+        Parameters
+        ----------
+        clock : callable, returns seconds, defaults to time.monotonic
+        sleep : callable, sleeps for seconds, defaults to time.sleep
+        """
+        self.clock = _clock if clock is None else clock
+        self.sleep = time.sleep if sleep is None else sleep
+
+        self.tasks = {}
+        self.missed = []  # (name, due time, seconds late) for each missed deadline
+        self.errors = []  # (name, due time, exception) for each exception raised
+
+        self._heap = []
+        self._seq = 0     # tie breaker, keeps the heap from comparing Tasks
+
+    def _push(self, t, phase, task, due):
+        self._seq += 1
+        heapq.heappush(self._heap, (t, self._seq, phase, task, due))
+
+    def add(self, name, run, period, start=None, settle=0, deadline=None,
+            callback=None, offset=0):
+        """Add a task, first due offset seconds from now.  See Task for
+        parameter descriptions.
+
+        Returns
+        -------
+        Task instance
+        """
+        task = Task(name=name, run=run, period=period, start=start,
+                    settle=settle, deadline=deadline, callback=callback)
+        self.tasks[name] = task
+        due = self.clock() + offset
+        self._push(due, 'start', task, due)
+        return task
+
+    def remove(self, name):
+        """Remove a task, pending events for it are dropped"""
+        task = self.tasks.pop(name)
+        self._heap = [e for e in self._heap if e[3] is not task]
+        heapq.heapify(self._heap)
+
+    def step(self):
+        """Wait for and process the next due event
+
+        Returns
+        -------
+        bool, False if there are no tasks
+        """
+        if len(self._heap) == 0:
+            return False
+        t, _, phase, task, due = self._heap[0]
+        dt = t - self.clock()
+        if dt > 0:
+            self.sleep(dt)
+        heapq.heappop(self._heap)
+
+        if phase == 'start':
+            self._schedule_next(task, due)
+            if task.start is not None:
+                try:
+                    task.start()
+                except Exception as e:
+                    self._error(task, due, e)
+                    return True
+                self._push(self.clock() + task.settle, 'run', task, due)
+                return True
+        self._run(task, due)
+        return True
+
+    def _schedule_next(self, task, due):
+        """Schedule the next period from the due time, skipping any
+        periods that have already passed"""
+        next_due = due + task.period
+        now = self.clock()
+        if next_due < now:
+            n = int((now - next_due) / task.period) + 1
+            task.skipped += n
+            next_due += n * task.period
+        self._push(next_due, 'start', task, next_due)
+
+    def _error(self, task, due, e):
+        task.errors += 1
+        task.error = e
+        self.errors.append((task.name, due, e))
+
+    def _run(self, task, due):
+        try:
+            task.result = task.run()
+        except Exception as e:
+            task.result = None
+            self._error(task, due, e)
+            return
+        task.runs += 1
+        late = self.clock() - (due + task.deadline)
+        if late > 0:
+            task.missed += 1
+            task.max_late = max(task.max_late, late)
+            self.missed.append((task.name, due, late))
+        if task.callback is not None:
+            try:
+                task.callback(task.result)
+            except Exception as e:
+                self._error(task, due, e)
+
+    def run(self, duration=None):
+        """Process events until duration seconds have passed, or forever
+        if duration is None"""
+        t_end = None if duration is None else self.clock() + duration
+        while (t_end is None) or (self._heap and self._heap[0][0] <= t_end):
+            if not self.step():
+                break
+
+    def report(self):
+        """Get run statistics for each task
+
+        Returns
+        -------
+        dict, task name: dict of runs, missed, skipped, max_late and errors
+        """
+        return {name: {'runs': task.runs,
+                       'missed': task.missed,
+                       'skipped': task.skipped,
+                       'max_late': task.max_late,
+                       'errors': task.errors}
+                for name, task in self.tasks.items()}
@@ -1,9 +1,36 @@
 """CSV and JSON writing and publishing methods"""
 
 
-from meerkat.base import Base, _json_dumps
+from meerkat.base import Base, _json_dumps, time
 from meerkat.data.timepiece import TimePiece
 
+try:
+    import atexit
+    import threading
+    import weakref
+except ImportError:
+    threading = None
+
+
+class _NoLock:
+    """Stand in for threading.RLock where there are no threads"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+if threading is not None:
+    # writers holding buffered rows, flushed when the interpreter exits
+    _buffered_writers = weakref.WeakSet()
+
+    def _close_buffered():
+        for writer in list(_buffered_writers):
+            writer.close()
+
+    atexit.register(_close_buffered)
+
 
 class Meta(Base):
     """Metadata for data source"""
@@ -45,6 +72,10 @@ class WriterBase(Base):
         where (file extension) is either '.csv' or '.jsontxt'
         if self._metadata['description'] is None, it is omitted from the file name
     Note 3: Properties hide class attributes from being written as metadata
+    Note 4: Set self.buffered = True to keep the output file open and write
+        rows in batches.  Rows are written when a buffer limit is reached,
+        by a timer buffer_age seconds after the oldest row was added, by
+        self.close or the end of a with statement, and at interpreter exit
     """
     def __init__(self, metadata, time_source):
         """
@@ -52,7 +83,7 @@ class WriterBase(Base):
         ----------
         metadata : meerkat.data.Meta class instance
         time_source : str, meerkat.data.TimePiece class data source. 
-            One of 'local', 'rtc', 'gps', 'external'. Default is 'local'
+            One of 'local', 'rtc', 'gps', 'external', 'monotonic'. Default is 'local'
         """
         # file information
         self.encoding        = 'utf-8'  # encoding of output. Should stay 'utf-8'!
@@ -84,13 +115,34 @@ class WriterBase(Base):
         #self.set_time_source(self.time_source)
         #self.set_time_kind(self.time_kind)
 
+        # buffered output, keeps the file open between writes and holds
+        # rows in memory until one of the buffer limits is reached
+        self.buffered     = False  # if True, buffer rows and keep file open
+        self.buffer_rows  = 100    # maximum rows held before a flush
+        self.buffer_bytes = 4096   # maximum characters held before a flush
+        self.buffer_age   = 5.0    # maximum seconds a row is held before a flush
+
+        self._file        = None   # open file handle when buffered
+        self._buffer      = []     # lines waiting to be written
+        self._buffer_n    = 0      # rows waiting to be written
+        self._buffer_size = 0      # characters waiting to be written
+        self._buffer_t0   = None   # time the oldest buffered row was added
+        self._timer       = None   # flushes buffered rows after buffer_age
+        self._lock        = _NoLock() if threading is None else threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def set_time_source(self, time_source):
         """Override default TimePiece data source
 
         Parameters
         ----------
         time_source : str, meerkat.data.TimePiece class data source. 
-            One of 'local', 'rtc', 'gps', 'external'
+            One of 'local', 'rtc', 'gps', 'external', 'monotonic'
         """
         self.time_source = time_source
         self._timepiece.source = time_source
@@ -108,10 +160,79 @@ class WriterBase(Base):
     def set_time(self, time_str):
         self._timepiece.set_time(time_str)
 
+    def _append(self, text, n=1):
+        """Append text to the file at location self.path. If self.buffered
+        is True, text is held in memory and written to a file handle that
+        stays open until self.close is called.
+
+        Parameters
+        ----------
+        text : str, one or more lines terminated with self.line_terminator
+        n : int, number of rows contained in text
+        """
+        if not self.buffered:
+            with open(self.path, 'a') as f:
+                f.write(text)
+            return
+
+        with self._lock:
+            if self._buffer_n == 0:
+                self._buffer_t0 = time.time()
+                self._start_timer()
+            self._buffer.append(text)
+            self._buffer_n += n
+            self._buffer_size += len(text)
+
+            if ((self._buffer_n >= self.buffer_rows) or
+                    (self._buffer_size >= self.buffer_bytes) or
+                    (time.time() - self._buffer_t0 >= self.buffer_age)):
+                self.flush()
+
+    def _start_timer(self):
+        """Flush buffer_age seconds from now, in a background thread"""
+        if threading is None:
+            return
+        _buffered_writers.add(self)
+        self._timer = threading.Timer(self.buffer_age, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        """Write all buffered rows to the open file at location self.path"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._buffer_n == 0:
+                return
+            if self._file is None:
+                self._file = open(self.path, 'a')
+            self._file.write(''.join(self._buffer))
+            self._file.flush()
+            self._buffer = []
+            self._buffer_n = 0
+            self._buffer_size = 0
+            self._buffer_t0 = None
+
+    def close(self):
+        """Flush buffered rows and close the file at location self.path.
+        A later write will reopen the file in append mode."""
+        with self._lock:
+            self.flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
 
 class CSVWriter(WriterBase):
     """Attributes of comma delimited values (CSV) data formatting"""
-    def __init__(self, metadata, time_source='std_time'):
+    def __init__(self, metadata, time_source='local'):
         super().__init__(metadata, time_source)
 
         self._file_init            = False              # file initialization flag
@@ -158,10 +279,9 @@ class CSVWriter(WriterBase):
 
     def _write_append(self, data):
         """Append data to an existing file at location self.path"""
-        with open(self.path, 'a') as f:
-            dc = ','.join([self._timepiece.get_time(), self.time_source] +
-                          [str(_x) for _x in data])
-            f.write(dc + self.line_terminator)
+        dc = ','.join([self._timepiece.get_time(), self.time_source] +
+                      [str(_x) for _x in data])
+        self._append(dc + self.line_terminator)
 
     def write(self, data):
         """Write data to file, write header if not yet done
@@ -177,7 +297,7 @@ class CSVWriter(WriterBase):
 
 class JSONWriter(WriterBase):
     """Attributes of JSON key-value data formatting"""
-    def __init__(self, metadata, time_source='std_time'):
+    def __init__(self, metadata, time_source='local'):
         super().__init__(metadata, time_source)
 
         self._file_init = False  # file initialization flag
@@ -206,16 +326,18 @@ class JSONWriter(WriterBase):
         data_out['metadata'] = device_metadata
         return data_out
 
-    def publish(self, data, timestamp=None):
-        """Return JSON data and metadata at intervals set by self.metadata_interval
+    def _record(self, data, timestamp=None):
+        """Zip data with header descriptions and add timestamp, plus
+        metadata at intervals set by self.metadata_interval
 
         Parameters
         ----------
         data : list, data to be zipped with header descriptions
+        timestamp : str, optional timestamp, if None the current time is used
 
         Returns
         -------
-        data_out : str, JSON formatted data and metadata
+        data_out : dict, data and metadata
         """
         data_out = {k: v for k, v in zip(self._metadata.header, data)}
 
@@ -229,16 +351,44 @@ class JSONWriter(WriterBase):
             self._metadata_stream_i = 1
         else:
             self._metadata_stream_i += 1
-        return _json_dumps(data_out)
+        return data_out
 
-    def write(self, data):
-        """Write JSON data and metadata at intervals set by
-        self.metadata_interval to file location self.path
+    def publish(self, data, timestamp=None):
+        """Return JSON data and metadata at intervals set by self.metadata_interval
 
         Parameters
         ----------
         data : list, data to be zipped with header descriptions
+        timestamp : str, optional timestamp, if None the current time is used
+
+        Returns
+        -------
+        data_out : str, JSON formatted data and metadata
+        """
+        return _json_dumps(self._record(data, timestamp))
+
+    def publish_batch(self, data_list, timestamps=None):
+        """Return JSON lines for many samples, with metadata at intervals
+        set by self.metadata_interval
+
+        Parameters
+        ----------
+        data_list : list of lists, data to be zipped with header descriptions
+        timestamps : list of str, optional timestamp for each item in
+            data_list, if None the current time is used for each sample
+
+        Returns
+        -------
+        str, one JSON record per line, each ending with self.line_terminator
         """
+        if timestamps is None:
+            timestamps = [None] * len(data_list)
+        lt = self.line_terminator
+        return ''.join([_json_dumps(self._record(d, t)) + lt
+                        for d, t in zip(data_list, timestamps)])
+
+    def _init_path(self):
+        """Set the output file path if not already set"""
         if self.path is None:
             if self.directory is None:
                 self.directory = ""
@@ -246,7 +396,28 @@ class JSONWriter(WriterBase):
                          self._metadata.name.lower().replace(' ', '_') +
                          '.jsontxt')
 
-        data_out = self.publish(data)
+    def write(self, data):
+        """Write JSON data and metadata at intervals set by
+        self.metadata_interval to file location self.path
+
+        Parameters
+        ----------
+        data : list, data to be zipped with header descriptions
+        """
+        self._init_path()
+        self._append(self.publish(data) + self.line_terminator)
+
+    def write_batch(self, data_list, timestamps=None):
+        """Write many samples of JSON data, with metadata at intervals set by
+        self.metadata_interval, to file location self.path in one write
 
-        with open(self.path, 'a') as f:
-            f.write(data_out + self.line_terminator)
+        Parameters
+        ----------
+        data_list : list of lists, data to be zipped with header descriptions
+        timestamps : list of str, optional timestamp for each item in
+            data_list, if None the current time is used for each sample
+        """
+        if len(data_list) == 0:
+            return
+        self._init_path()
+        self._append(self.publish_batch(data_list, timestamps), n=len(data_list))
@@ -0,0 +1,297 @@
+"""NMEA sentence parsing into typed records
+
+Supported sentences: GGA, RMC, GSA, GSV and VTG, from any talker
+(GP, GN, GL, ...).  Latitude and longitude are converted to decimal
+degrees, south and west negative.  Times are UTC, as seconds of the day
+for GGA and seconds since 1970-01-01 for RMC.  Empty fields are None.
+
+Example:
+
+>>> parse('$GNRMC,061112.000,A,3723.2475,N,12158.3416,W,0.0,0.0,181026,,,A*65')
+RMC(talker='GN', utc=1792303872.0, valid=True, lat=37.387458333333335, ...)
+
+Sentence field definitions: http://aprs.gids.nl/nmea/
+"""
+
+try:
+    from collections import namedtuple
+except ImportError:
+    from ucollections import namedtuple
+
+try:
+    from functools import reduce
+    from operator import xor
+except ImportError:
+    reduce = None
+
+
+# hex string of each checksum value
+_HEX = ['%02X' % i for i in range(256)]
+
+
+def checksum(s):
+    """NMEA checksum, the xor of all characters between '$' and '*'
+
+    Parameters
+    ----------
+    s : str or bytes, sentence body without '$' and '*'
+
+    Returns
+    -------
+    str, two uppercase hex digits
+    """
+    if isinstance(s, str):
+        s = s.encode()
+    if reduce is not None:
+        return _HEX[reduce(xor, s, 0)]
+    c = 0
+    for b in s:
+        c ^= b
+    return _HEX[c]
+
+
+def valid(sentence):
+    """Check the checksum of a NMEA sentence
+
+    Parameters
+    ----------
+    sentence : str, NMEA sentence including '$' and '*' plus checksum
+
+    Returns
+    -------
+    bool, True if the checksum matches
+    """
+    body, _, cs = sentence.strip().lstrip('$').partition('*')
+    return checksum(body) == cs.upper()
+
+
+## Field converters, empty fields return None ##
+
+def _float(x):
+    return float(x) if x else None
+
+
+def _int(x):
+    return int(x) if x else None
+
+
+def _seconds(hms):
+    """hhmmss.sss to seconds of the day"""
+    if not hms:
+        return None
+    return int(hms[0:2]) * 3600 + int(hms[2:4]) * 60 + float(hms[4:])
+
+
+def _degrees(value, hemisphere):
+    """(d)ddmm.mmmm and N/S/E/W to signed decimal degrees"""
+    if not value:
+        return None
+    i = value.index('.') - 2
+    d = int(value[:i]) + float(value[i:]) / 60
+    return -d if hemisphere in ('S', 'W') else d
+
+
+def _utc(hms, dmy):
+    """hhmmss.sss and ddmmyy to seconds since 1970-01-01"""
+    if not (hms and dmy):
+        return None
+    y, m, d = 2000 + int(dmy[4:6]), int(dmy[2:4]), int(dmy[0:2])
+    # days from civil date, see http://howardhinnant.github.io/date_algorithms.html
+    y -= m <= 2
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * (m + (-3 if m > 2 else 9)) + 2) // 5 + d - 1
+    days = era * 146097 + yoe * 365 + yoe // 4 - yoe // 100 + doy - 719468
+    return days * 86400 + _seconds(hms)
+
+
+def _is(flag):
+    return lambda x: x == flag
+
+
+def _prns(*x):
+    return tuple([int(p) for p in x if p])
+
+
+def _satellites(*x):
+    """Groups of prn, elevation, azimuth and snr"""
+    return tuple([(int(x[i]), _int(x[i+1]), _int(x[i+2]), _int(x[i+3]))
+                  for i in range(0, len(x), 4) if x[i]])
+
+
+def _signed(value, direction):
+    if not value:
+        return None
+    return -float(value) if direction == 'W' else float(value)
+
+
+# per sentence type, record fields as (name, converter, field indexes), with
+# field 0 the address, e.g. GPGGA
+_field_maps = {
+    'GGA': (('time', _seconds, (1,)),
+            ('lat', _degrees, (2, 3)),
+            ('lon', _degrees, (4, 5)),
+            ('quality', _int, (6,)),
+            ('n_satellites', _int, (7,)),
+            ('hdop', _float, (8,)),
+            ('altitude', _float, (9,)),
+            ('geoid_separation', _float, (11,))),
+    'RMC': (('utc', _utc, (1, 9)),
+            ('valid', _is('A'), (2,)),
+            ('lat', _degrees, (3, 4)),
+            ('lon', _degrees, (5, 6)),
+            ('speed_knots', _float, (7,)),
+            ('course', _float, (8,)),
+            ('variation', _signed, (10, 11))),
+    'GSA': (('mode', str, (1,)),
+            ('fix', _int, (2,)),
+            ('prns', _prns, tuple(range(3, 15))),
+            ('pdop', _float, (15,)),
+            ('hdop', _float, (16,)),
+            ('vdop', _float, (17,))),
+    'GSV': (('total_messages', _int, (1,)),
+            ('message_number', _int, (2,)),
+            ('n_in_view', _int, (3,)),
+            ('satellites', _satellites, tuple(range(4, 20)))),
+    'VTG': (('course_true', _float, (1,)),
+            ('course_magnetic', _float, (3,)),
+            ('speed_knots', _float, (5,)),
+            ('speed_kmh', _float, (7,))),
+}
+
+# number of fields each sentence type is padded to
+_field_counts = {k: max([max(f[2]) for f in v]) + 1 for k, v in _field_maps.items()}
+
+
+def _compile(field_map):
+    """Converter and field indexes of each record field, as an int for one
+    field, a pair for two and a slice for more"""
+    compiled = []
+    for name, conv, idx in field_map:
+        if len(idx) == 1:
+            compiled.append((conv, idx[0], None))
+        elif len(idx) == 2:
+            compiled.append((conv, idx[0], idx[1]))
+        else:
+            compiled.append((conv, slice(idx[0], idx[-1] + 1), None))
+    return compiled
+
+
+_compiled_maps = {k: _compile(v) for k, v in _field_maps.items()}
+
+# record class for each sentence type
+records = {k: namedtuple(k, ['talker'] + [f[0] for f in v]) for k, v in _field_maps.items()}
+
+GGA = records['GGA']
+RMC = records['RMC']
+GSA = records['GSA']
+GSV = records['GSV']
+VTG = records['VTG']
+
+
+def parse(sentence, check=True):
+    """Parse one NMEA sentence into a record
+
+    Parameters
+    ----------
+    sentence : str, NMEA sentence, with or without the leading '$'
+    check : bool, if True return None when the checksum does not match
+
+    Returns
+    -------
+    GGA, RMC, GSA, GSV or VTG record, or None if the sentence type is
+        not supported, the checksum fails or a field can not be converted
+    """
+    body, _, cs = sentence.strip().lstrip('$').partition('*')
+    sentence_type = body[2:5]
+    field_map = _compiled_maps.get(sentence_type)
+    if field_map is None:
+        return None
+    if check and (checksum(body) != cs.upper()):
+        return None
+    f = body.split(',')
+    n = _field_counts[sentence_type]
+    if len(f) < n:
+        f += [''] * (n - len(f))
+    values = [body[0:2]]
+    try:
+        for conv, i, j in field_map:
+            if j is not None:
+                values.append(conv(f[i], f[j]))
+            elif i.__class__ is int:
+                values.append(conv(f[i]))
+            else:
+                values.append(conv(*f[i]))
+    except (ValueError, IndexError):
+        return None
+    return records[sentence_type](*values)
+
+
+def parse_lines(lines, check=True, types=None):
+    """Parse NMEA sentences from lines of text into columns.  Each line may
+    hold other text before the sentence, like the timestamp and quotes of a
+    Meerkat CSV file.
+
+    Parameters
+    ----------
+    lines : iterable of str
+    check : bool, skip sentences whose checksum does not match
+    types : list of str, sentence types to keep, defaults to all supported
+
+    Returns
+    -------
+    dict, sentence type: dict of column name: list of values, with
+        columns 'line' for the line number and 'prefix' for the text
+        before the sentence, then the record fields
+    """
+    types = list(_field_maps) if types is None else types
+    columns = {t: {c: [] for c in ('line', 'prefix') + records[t]._fields}
+               for t in types}
+    for line_n, line in enumerate(lines):
+        i = line.find('$')
+        if i < 0:
+            continue
+        j = line.find('*', i)
+        end = len(line) if j < 0 else j + 3
+        record = parse(line[i:end], check=check)
+        if record is None:
+            continue
+        c = columns.get(record.__class__.__name__)
+        if c is None:
+            continue
+        c['line'].append(line_n)
+        c['prefix'].append(line[:i].rstrip(',"'))
+        for name, value in zip(record._fields, record):
+            c[name].append(value)
+    return columns
+
+
+def parse_file(fp, check=True, types=None):
+    """Parse every NMEA sentence in a log file into columnar arrays.
+    Numeric columns are NumPy arrays with NaN for empty fields, if NumPy
+    is installed.  See parse_lines.
+
+    Parameters
+    ----------
+    fp : str, path to a raw NMEA log or a file written by PA1010D.write
+    check : bool, skip sentences whose checksum does not match
+    types : list of str, sentence types to keep, defaults to all supported
+
+    Returns
+    -------
+    dict, sentence type: dict of column name: array or list of values
+    """
+    with open(fp, 'r') as f:
+        columns = parse_lines(f, check=check, types=types)
+    try:
+        import numpy as np
+    except ImportError:
+        return columns
+    for c in columns.values():
+        for name, values in c.items():
+            if name in ('line', 'prefix', 'talker', 'mode', 'prns', 'satellites'):
+                continue
+            c[name] = np.array([np.nan if v is None else v for v in values],
+                               dtype=float)
+        c['line'] = np.array(c['line'], dtype=int)
+    return columns
@@ -5,6 +5,7 @@ import pandas as pd
 
 
 ## Data specific headers ##
+# for typed NMEA records and columnar arrays without pandas, see meerkat.data.nmea
 
 #  Global Positioning System Fix Data
 #  http://aprs.gids.nl/nmea/#gga
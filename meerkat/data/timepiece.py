@@ -1,12 +1,50 @@
 #import time
 
+import sys
+
 from meerkat.base import time, _struct_time, Base
 
 
+# str.format versions of the kinds, split into the part that changes once a
+# second and the sub-second part
+_prefix_formats = {'std_time':    '{:02d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}',
+                   'std_time_ms': '{:02d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}.',
+                   'iso_time':    '{:02d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}.',
+                   'file_time':   '{:02d}_{:02d}_{:02d}_{:02d}_{:02d}_{:02d}',
+                   }
+_suffix_formats = {'std_time_ms': '{:06}',
+                   'iso_time':    '{:06}',
+                   }
+
+# local time without building a datetime, on Linux only since MicroPython
+# ports keep time in their RTC
+if sys.platform == 'linux':
+    _time_ns = time.time_ns
+else:
+    _time_ns = None
+
+# acquisition clock for the 'monotonic' source
+_monotonic_ns = getattr(time, 'monotonic_ns', None)
+
+
+def _epoch_seconds(t):
+    """Seconds since 1970-01-01 of a calendar time tuple, without any time
+    zone conversion.  Days from civil date, see
+    http://howardhinnant.github.io/date_algorithms.html"""
+    y, m, d = int(t[0]), int(t[1]), int(t[2])
+    y -= m <= 2
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * (m + (-3 if m > 2 else 9)) + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    days = era * 146097 + doe - 719468
+    return ((days * 24 + int(t[3])) * 60 + int(t[4])) * 60 + int(t[5])
+
+
 class TimePiece(Base):
     """Formatting methods for creating strftime compliant timestamps
 
-    Data sources: 'local', 'rtc', 'gps', 'external'
+    Data sources: 'local', 'rtc', 'gps', 'external', 'monotonic'
     Data kinds: 'std_time', std_time_ms', 'iso_time', 'file_time', 'gps_location', 'external'
     """
     def __init__(self, source='local', kind='std_time_ms', time_zone=None):
@@ -26,21 +64,48 @@ class TimePiece(Base):
         self.source = None
         self.set_source(source)
         
-        self.kind = kind
+        self.kind = None
         self.time_format = None
-        #self.set_format(kind)
+
+        # formatter set by set_kind, with the formatted part of the last
+        # timestamp that changes once a second
+        self.cache_prefix = True
+        self._prefix_format = None
+        self._suffix_format = None
+        self._prefix = None
+        self._prefix_key = None
 
         # optional timezone
         self._tz = None
         self.tz  = time_zone
 
+        self.set_kind(kind)
+
         # external hardware time sources, must be set after initialization
         self.rtc = None
         self.gps = None
 
+        # optional GPSClock, answers the 'gps' source from its last fix
+        # instead of reading the GPS, using gps_fallback if it is stale.
+        # Fallback times are formatted in UTC like the GPS times
+        self.gps_clock = None
+        self.gps_fallback = 'local'
+
         # external time string, generated by another instance or external source
         self._external_time = None
 
+        # 'monotonic' source, time.monotonic_ns interpolated between anchors
+        # read from anchor_source every anchor_interval seconds
+        self.anchor_source = 'local'
+        self.anchor_interval = 60
+        self.anchor_rate_limit = 0.001  # largest clock rate error accepted
+        self.anchor_poll = 0.005        # seconds between RTC reads while anchoring
+        self.anchor_resolution = 0.02   # largest seconds between the RTC reads around a second change
+        self._anchors = []              # last two (monotonic ns, wall ns)
+        self._coarse = False            # first RTC anchor, read without waiting for a second change
+        self._rtc_last = None           # last (rtc time, monotonic ns) read while anchoring
+        self._last_ns = None            # last timestamp returned, in ns
+
     @property
     def tz(self):
         return self._tz
@@ -50,12 +115,17 @@ class TimePiece(Base):
         if time_zone is None:
             self._tz = ''
         else: self._tz = time_zone
+        if self.kind is not None:
+            self.set_kind(self.kind)
 
     def set_source(self, source):
         """Override default time source
-        Must be one of the following: 'local', 'rtc', 'gps', 'external'
+        Must be one of the following: 'local', 'rtc', 'gps', 'external',
+        'monotonic'
         """
-        assert source in ['local', 'rtc', 'gps', 'external'], f'Source `{source}` not supported'
+        assert source in ['local', 'rtc', 'gps', 'external', 'monotonic'], f'Source `{source}` not supported'
+        if source == 'monotonic':
+            assert _monotonic_ns is not None, 'time.monotonic_ns not available'
         self.source = source
 
     def set_kind(self, kind):
@@ -72,6 +142,15 @@ class TimePiece(Base):
         self.kind = kind
         self.time_format = self.kinds_available[kind]
 
+        prefix = _prefix_formats.get(kind)
+        suffix = _suffix_formats.get(kind, '')
+        if kind == 'iso_time':
+            suffix = suffix + self.tz.replace('{', '{{').replace('}', '}}')
+        self._prefix_format = None if prefix is None else prefix.format
+        self._suffix_format = suffix.format
+        self._prefix = None
+        self._prefix_key = None
+
     def set_time(self, time_str):
         """Set the returned string formatted time manually. Used for shared
         timestamps. To be useful in post-collection analysis, set the format
@@ -92,24 +171,187 @@ class TimePiece(Base):
         -------
         str, formatted current time based on input argument
         """
-        if self.source == 'external':
-            return self._eternal_time
-        if (self.source == 'gps') & (self.kind == 'gps_location'):
+        source = self.source
+        if source == 'external':
+            return self._external_time
+        if (source == 'gps') & (self.kind == 'gps_location'):
             return self.gps_location()
-        if self.source == 'local':
+        if (source == 'gps') and (self.gps_clock is not None):
+            ns = self.gps_clock.time_ns()
+            if ns is not None:
+                return self.format_ns(ns, local=False)
+            # stale fix, format the fallback in UTC like the GPS rows
+            source = self.gps_fallback
+            if (source == 'local') and (_time_ns is not None):
+                return self.format_ns(_time_ns(), local=False)
+            if source == 'monotonic':
+                return self.format_ns(self.timestamp_ns(), local=False)
+        if (source == 'local') and (_time_ns is not None) and self.cache_prefix:
+            return self.format_ns(_time_ns(), local=True)
+        if source == 'monotonic':
+            return self.format_ns(self.timestamp_ns())
+        if source == 'local':
             t = self._struct_time()
-        if self.source == 'rtc':
+        if source == 'rtc':
             t = self.rtc_time()
-        if self.source == 'gps':
+        if source == 'gps':
+            t = self.gps_time()
+        return self.format_time(t)
+
+    def format_time(self, t):
+        """Format a time tuple as self.kind.  The part that changes once a
+        second is reused while the second is unchanged, if self.cache_prefix.
+
+        Parameters
+        ----------
+        t : tuple, year, month, day, hour, minute, second, microsecond
+
+        Returns
+        -------
+        str, formatted time
+        """
+        key = tuple(t[:6])
+        if (key != self._prefix_key) or not self.cache_prefix:
+            self._prefix = self._prefix_format(*key)
+            self._prefix_key = key
+        return self._prefix + self._suffix_format(t[6])
+
+    def format_ns(self, ns, local=None):
+        """Format a time from self.timestamp_ns as self.kind.  The part
+        that changes once a second is reused while the second is unchanged,
+        if self.cache_prefix.
+
+        Parameters
+        ----------
+        ns : int, nanoseconds since 1970-01-01
+        local : bool, convert to local time, defaults to True if
+            self.anchor_source is 'local'.  RTC and GPS times are not
+            converted.
+
+        Returns
+        -------
+        str, formatted time
+        """
+        if local is None:
+            local = self.anchor_source == 'local'
+        sec, ns = divmod(ns, 1000000000)
+        key = (sec, local)
+        if (key != self._prefix_key) or not self.cache_prefix:
+            t = time.localtime(sec) if local else time.gmtime(sec)
+            self._prefix = self._prefix_format(*t[:6])
+            self._prefix_key = key
+        return self._prefix + self._suffix_format(ns // 1000)
+
+    def anchor(self, block=True):
+        """Read the anchor_source clock and the monotonic clock together,
+        for the 'monotonic' source.  The RTC only counts whole seconds, so
+        it is read until the second changes.
+
+        Parameters
+        ----------
+        block : bool, for the 'rtc' anchor_source, read the RTC every
+            anchor_poll seconds until the second changes, up to 1.5 seconds.
+            If False, read it once and only anchor if the second changed
+            since the last read.
+
+        Returns
+        -------
+        bool, True if a new anchor was recorded
+        """
+        if self.anchor_source == 'local':
+            mono = _monotonic_ns()
+            wall = _time_ns()
+        elif self.anchor_source == 'rtc':
+            return self._anchor_rtc(block)
+        elif (self.anchor_source == 'gps') and (self.gps_clock is not None):
+            mono = _monotonic_ns()
+            wall = self.gps_clock.time_ns(mono)
+            if wall is None:
+                # no recent fix, keep the last anchor or start from
+                # the system clock, which is also UTC
+                if len(self._anchors) > 0:
+                    return False
+                wall = _time_ns()
+        elif self.anchor_source == 'gps':
             t = self.gps_time()
+            mono = _monotonic_ns()
+            frac = str(t[6])
+            wall = (_epoch_seconds(t) * 1000000000 +
+                    int(frac) * 10**(9 - len(frac)))
+        self._anchors = self._anchors[-1:] + [(mono, wall)]
+        return True
+
+    def _anchor_rtc(self, block):
+        """Anchor to the RTC second change, found between two reads no
+        more than anchor_resolution seconds apart.  See self.anchor"""
+        t_end = _monotonic_ns() + 1500000000
+        while True:
+            t = self.rtc_time()
+            mono = _monotonic_ns()
+            last = self._rtc_last
+            self._rtc_last = (t, mono)
+            if ((last is not None) and (t != last[0]) and
+                    (mono - last[1] <= self.anchor_resolution * 1000000000)):
+                break
+            if (not block) or (mono > t_end):
+                if len(self._anchors) == 0:
+                    # start from the whole second until the change is seen
+                    self._anchors = [(mono, _epoch_seconds(t) * 1000000000)]
+                    self._coarse = True
+                return False
+            time.sleep(self.anchor_poll)
+        # the second changed between the last two reads
+        mono = (mono + last[1]) // 2
+        wall = _epoch_seconds(t) * 1000000000
+        if self._coarse:
+            self._anchors = []
+            self._coarse = False
+        self._anchors = self._anchors[-1:] + [(mono, wall)]
+        self._rtc_last = None
+        return True
+
+    def timestamp_ns(self, mono_ns=None):
+        """Convert a time.monotonic_ns reading to wall clock time by linear
+        interpolation from the last anchors, re-anchoring every
+        anchor_interval seconds.  Timestamps returned without mono_ns
+        always increase.  Re-anchoring never blocks, with the 'rtc'
+        anchor_source the RTC is read at most once per call, every
+        anchor_poll seconds, until the second change is seen.  Call
+        self.anchor from a separate step if timestamps are requested less
+        often than anchor_resolution seconds.
 
-        _formats = {'std_time':     '{:02d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}',
-                    'std_time_ms':  '{:02d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}.{:06}',
-                    'iso_time':     '{:02d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}.{:06}' + self.tz,
-                    'file_time':    '{:02d}_{:02d}_{:02d}_{:02d}_{:02d}_{:02d}',
-                    }
-        str_format = _formats[self.kind]
-        return str_format.format(*t)  # format doesn't like tuples, needs args
+        Parameters
+        ----------
+        mono_ns : int, optional, time.monotonic_ns recorded when a sample
+            was acquired, defaults to now
+
+        Returns
+        -------
+        int, nanoseconds since 1970-01-01
+        """
+        now = mono_ns is None
+        if now:
+            mono_ns = _monotonic_ns()
+        if ((len(self._anchors) == 0) or self._coarse or
+                (mono_ns - self._anchors[-1][0] > self.anchor_interval * 1000000000)):
+            last = self._rtc_last
+            if ((last is None) or (self.anchor_source != 'rtc') or
+                    (_monotonic_ns() - last[1] >= self.anchor_poll * 1000000000)):
+                self.anchor(block=False)
+        m1, w1 = self._anchors[-1]
+        rate = 1.0
+        if len(self._anchors) == 2:
+            m0, w0 = self._anchors[0]
+            if m1 > m0:
+                rate = (w1 - w0) / (m1 - m0)
+            if abs(rate - 1.0) > self.anchor_rate_limit:
+                rate = 1.0
+        ns = w1 + int((mono_ns - m1) * rate)
+        if now:
+            if (self._last_ns is not None) and (ns <= self._last_ns):
+                ns = self._last_ns + 1000
+            self._last_ns = ns
+        return ns
 
     def rtc_time(self):
         """Get time from the DS3221 RTC
@@ -174,3 +416,137 @@ class TimePiece(Base):
         """Return a previously set external time. Useful for synchronizing
         timestamps between data sources"""
         return self._external_time
+
+
+class GPSClock:
+    """Track GPS time in a background thread from the latest valid RMC
+    sentence, so timestamps are read from memory instead of the GPS.
+
+    Example:
+
+    >>> gps_clock = GPSClock(gps)
+    >>> gps_clock.start()
+    >>> tp = TimePiece(source='gps')
+    >>> tp.gps_clock = gps_clock
+    >>> tp.get_time()
+    """
+    def __init__(self, gps, poll_interval=1.0, max_age=10):
+        """
+        Parameters
+        ----------
+        gps : meerkat.driver.pa1010d.PA1010D instance
+        poll_interval : float, seconds between RMC reads
+        max_age : float, seconds after the last fix that time is still
+            extrapolated from it, after which time_ns returns None
+        """
+        self.gps = gps
+        self.poll_interval = poll_interval
+        self.max_age = max_age
+
+        self.fixes = 0    # valid RMC fixes received
+        self.errors = 0   # reads that failed or had no valid fix
+
+        self._fix = None  # (GPS time ns, time.monotonic_ns when received)
+        self._thread = None
+        self._stop = None
+
+    @staticmethod
+    def rmc_time_ns(sentence):
+        """Get the UTC time of an RMC sentence
+
+        Parameters
+        ----------
+        sentence : str, NMEA RMC sentence
+
+        Returns
+        -------
+        int, nanoseconds since 1970-01-01, or None if the fix is not valid
+        """
+        fields = sentence.split(',')
+        if (len(fields) < 10) or (fields[2] != 'A'):
+            return None
+        hms = fields[1]
+        d = fields[9]
+        t = (2000 + int(d[4:6]), int(d[2:4]), int(d[0:2]),
+             int(hms[0:2]), int(hms[2:4]), int(hms[4:6]))
+        ns = _epoch_seconds(t) * 1000000000
+        if '.' in hms:
+            frac = hms.split('.')[1]
+            ns += int(frac) * 10**(9 - len(frac))
+        return ns
+
+    def update(self):
+        """Read one RMC sentence from the GPS and keep it if valid.  If
+        the GPS background reader is running, its latest RMC sentence and
+        the time it was received are used instead.
+
+        Returns
+        -------
+        bool, True if a valid fix was received
+        """
+        latest = getattr(self.gps, 'latest', {})
+        if (getattr(self.gps, '_reader', None) is not None) and ('RMC' in latest):
+            sentence, t = latest['RMC']
+            mono = int(t * 1000000000)
+        else:
+            sentence = self.gps.get(nmea_sentences=['RMC'], timeout=self.poll_interval)[0]
+            mono = _monotonic_ns()
+        ns = None
+        if sentence:
+            ns = self.rmc_time_ns(sentence)
+        if ns is None:
+            self.errors += 1
+            return False
+        self._fix = (ns, mono)
+        self.fixes += 1
+        return True
+
+    def time_ns(self, mono_ns=None):
+        """Extrapolate GPS time from the last fix
+
+        Parameters
+        ----------
+        mono_ns : int, optional, time.monotonic_ns to get the time of,
+            defaults to now
+
+        Returns
+        -------
+        int, nanoseconds since 1970-01-01, or None if there is no fix
+            within max_age seconds
+        """
+        fix = self._fix
+        if fix is None:
+            return None
+        if mono_ns is None:
+            mono_ns = _monotonic_ns()
+        dt = mono_ns - fix[1]
+        if dt > self.max_age * 1000000000:
+            return None
+        return fix[0] + dt
+
+    def _run(self):
+        while not self._stop.is_set():
+            t0 = _monotonic_ns()
+            try:
+                self.update()
+            except Exception:
+                self.errors += 1
+            dt = (_monotonic_ns() - t0) / 1e9
+            self._stop.wait(max(0, self.poll_interval - dt))
+
+    def start(self):
+        """Start reading the GPS in a background thread"""
+        import threading
+        if self._thread is not None:
+            return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
@@ -1,6 +1,8 @@
 """TI ADS1x15 ADC I2C Driver for Raspberry PI & MicroPython"""
 
-from meerkat.base import I2C, time
+from array import array
+
+from meerkat.base import I2C, time, struct
 from meerkat.data import Meta, CSVWriter, JSONWriter
 
 
@@ -59,6 +61,18 @@ class ADS1115(object):
         self.pga_float = -999
         self.volts = -999
 
+        # conversion register buffer for continuous sampling
+        self._conversion_buffer = bytearray(2)
+
+        # multi-channel scan list, see self.set_scan
+        self.scan_mux = None
+        self.scan_data_rate = None
+        self._scan_words = None
+        self._scan_delay = None
+        self.scan_metadata = None
+        self.scan_csv_writer = None
+        self.scan_json_writer = None
+
         # attribute converters
         self.str_mux = {'01': 0b000, '03': 0b001, '13': 0b010, '23': 0b011,
                         '0G': 0b100, '1G': 0b101, '2G': 0b110, '3G': 0b111}
@@ -94,7 +108,7 @@ class ADS1115(object):
         self.metadata.accuracy  = [None, 1, None, '+/- 3 LSB']
         self.metadata.precision = [None, 1, None, '16 bit']
         
-        self.metadata.bus_n = bus_n
+        self.metadata.bus_n = getattr(i2c_bus, 'bus_n', None)
         self.metadata.bus_addr = hex(bus_addr)
     
         # current settings of this device
@@ -104,8 +118,8 @@ class ADS1115(object):
         self.sample_id = None
         
         self.writer_output = output
-        self.csv_writer = CSVWriter(metadata=self.metadata, time_source='std_time_ms')
-        self.json_writer = JSONWriter(metadata=self.metadata, time_source='std_time_ms')
+        self.csv_writer = CSVWriter(metadata=self.metadata, time_source='local')
+        self.json_writer = JSONWriter(metadata=self.metadata, time_source='local')
         
         # initialize class attributes from device registry
         self.get_config()
@@ -387,6 +401,206 @@ class ADS1115(object):
         self.volts = _x * (self.pga_float / 2**15)
         return self.volts
 
+    def continuous_mode(self, data_rate=860):
+        """Set continuous conversion mode and data rate with one
+        configuration register write.
+
+        Parameters
+        ----------
+        data_rate : int, samples per second.
+            Allowed values: 8, 16, 32, 64,
+            128, 250, 475, 860
+        """
+        self.config_value = ((self.config_value & 0xFE1F)
+                             | (self.str_mode['continuous'] << 8)
+                             | (self.str_data_rate[data_rate] << 5))
+        self.set_config()
+        self.update_attributes()
+
+    def conversion_ready_mode(self):
+        """Configure the ALERT/RDY pin as a conversion ready signal by
+        setting the Hi_thresh MSB to 1, the Lo_thresh MSB to 0 and
+        asserting after one conversion.  The pin pulses at the end of
+        each conversion in continuous mode, see datasheet 9.3.8.
+        """
+        self.write_register_16bit('hi_thresh', 0x8000)
+        self.write_register_16bit('lo_thresh', 0x0000)
+        self.config_value = self.config_value & 0xFFFC  # COMP_QUE = 0b00
+        self.set_config()
+        self.update_attributes()
+        self.get_lo()
+        self.get_hi()
+
+    def sample_continuous(self, n, data_rate=860, buffer=None, ready=None):
+        """Sample the current multiplexer pin pair in continuous mode.
+
+        Reads are paced by the data rate period, or by the ready
+        function if given, i.e. one that waits for the ALERT/RDY pin
+        configured with self.conversion_ready_mode.
+
+        Parameters
+        ----------
+        n : int, number of samples to read
+        data_rate : int, samples per second, see self.continuous_mode
+        buffer : array('h') or NumPy int16 array of at least n values,
+            optional pre-allocated output. If None, an array('h') is created
+        ready : callable, optional, blocks until a conversion is ready
+
+        Returns
+        -------
+        buffer, signed conversion results, convert with self.counts_to_volts
+        """
+        if buffer is None:
+            buffer = array('h', bytes(2 * n))
+        self.continuous_mode(data_rate)
+
+        read = self.bus.read_register_into
+        reg_addr = self.reg_map['conversion']
+        conversion = self._conversion_buffer
+
+        period = 1 / self.bin_data_rate[self.dr_value]
+        t_next = time.time() + period
+        for i in range(n):
+            if ready is None:
+                dt = t_next - time.time()
+                if dt > 0:
+                    time.sleep(dt)
+                t_next += period
+            else:
+                ready()
+            read(reg_addr, conversion)
+            buffer[i] = struct.unpack('>h', conversion)[0]
+        return buffer
+
+    def counts_to_volts(self, counts):
+        """Convert signed conversion results to volts using the current
+        programmable gain amplifier range
+
+        Parameters
+        ----------
+        counts : sequence of int, i.e. from self.sample_continuous
+
+        Returns
+        -------
+        NumPy array of float volts, or list if NumPy is not available
+        """
+        lsb = self.pga_float / 2**15
+        try:
+            import numpy as np
+            return np.asarray(counts, dtype=float) * lsb
+        except ImportError:
+            return [c * lsb for c in counts]
+
+    def set_scan(self, mux_list, data_rate=860):
+        """Set the multiplexer pin pairs for self.scan and precompute the
+        single shot configuration register value for each.  The current
+        PGA and comparator settings are used for all channels.
+
+        Scan rows are written with their own metadata and writers,
+        self.scan_metadata, self.scan_csv_writer and self.scan_json_writer,
+        to a separate file from self.write rows.
+
+        Parameters
+        ----------
+        mux_list : list of str, pin pairs, see self.mux, i.e. ['0G', '1G', '2G', '3G']
+        data_rate : int, samples per second, see self.data_rate
+        """
+        header = ['description', 'sample_n', 'scan_time'] + ['v_' + x for x in mux_list]
+        if ((self.scan_metadata is not None) and (header != self.scan_metadata.header) and
+                ((self.scan_csv_writer.path is not None) or
+                 (self.scan_json_writer.path is not None))):
+            raise ValueError('Scan file already started with pin pairs ' +
+                             str(self.scan_mux) + ', set self.scan_metadata to None to start a new one')
+
+        base = ((self.config_value & 0x0E1F)
+                | (0b1 << 15)
+                | (self.str_mode['single'] << 8)
+                | (self.str_data_rate[data_rate] << 5))
+        self._scan_words = [base | (self.str_mux[x] << 12) for x in mux_list]
+
+        # conversion time plus the 10% data rate tolerance in the datasheet
+        self._scan_delay = 1.1 / data_rate
+
+        self.scan_mux = list(mux_list)
+        self.scan_data_rate = data_rate
+
+        if self.scan_metadata is None:
+            self.scan_metadata = Meta(name=self.metadata.name + ' scan')
+            for attr in ('description', 'urls', 'manufacturer', 'bus_n', 'bus_addr'):
+                setattr(self.scan_metadata, attr, getattr(self.metadata, attr))
+            self.scan_csv_writer = CSVWriter(metadata=self.scan_metadata, time_source='local')
+            self.scan_json_writer = JSONWriter(metadata=self.scan_metadata, time_source='local')
+
+        _n = len(mux_list)
+        self.scan_metadata.header    = header
+        self.scan_metadata.dtype     = ['str', 'int', 'float'] + ['float'] * _n
+        self.scan_metadata.units     = [None, 'count', 'seconds'] + ['volts'] * _n
+        self.scan_metadata.accuracy  = [None, 1, None] + ['+/- 3 LSB'] * _n
+        self.scan_metadata.precision = [None, 1, None] + ['16 bit'] * _n
+        self.scan_metadata.pga_gain  = self.pga_float
+
+    def scan(self, description='NA', n=1, delay=None):
+        """Read each pin pair set with self.set_scan in turn, using one
+        configuration register write and one conversion read per channel.
+
+        Parameters
+        ----------
+        description : str, description of data sample collected
+        n : int, number of scans to record in this burst
+        delay : float, seconds to delay between scans if n > 1
+
+        Returns
+        -------
+        data : list of lists, one row per scan containing:
+            description : str
+            n : sample number in this burst
+            scan_time : float, seconds since the epoch at the start of the scan
+            and one voltage for each pin pair in self.scan_mux
+        """
+        return list(self._scan_rows(description, n, delay))
+
+    def _scan_rows(self, description, n, delay):
+        """Yield each row of self.scan as soon as it is read"""
+        write = self.bus.write_register_16bit
+        read = self.bus.read_register_into
+        reg_config = self.reg_map['config']
+        reg_conversion = self.reg_map['conversion']
+        conversion = self._conversion_buffer
+        lsb = self.pga_float / 2**15
+        wait = self._scan_delay
+
+        try:
+            for m in range(n):
+                row = [description, m, time.time()]
+                for word in self._scan_words:
+                    write(reg_config, word)
+                    time.sleep(wait)
+                    read(reg_conversion, conversion)
+                    row.append(struct.unpack('>h', conversion)[0] * lsb)
+                yield row
+                if delay is not None:
+                    time.sleep(delay)
+        finally:
+            # keep attributes consistent with the last configuration written
+            self.config_value = self._scan_words[-1] & BIT_OS
+            self.update_attributes()
+
+    def write_scan(self, description='NA', n=1, delay=None):
+        """Scan all pin pairs set with self.set_scan and save to the scan
+        file, formatted as either .csv or .json.  Each scan is written as
+        soon as it is read, so its timestamp is the time of the scan.
+
+        Parameters
+        ----------
+        description : str, description of data sample collected
+        n : int, number of scans to record in this burst
+        delay : float, seconds to delay between scans if n > 1
+        """
+        wr = {"csv": self.scan_csv_writer,
+              "json": self.scan_json_writer}[self.writer_output]
+        for data in self._scan_rows(description, n, delay):
+            wr.write(data)
+
     def print_attributes(self):
         """Print to console current attributes"""
         print('ADS11x5 Configuration Attributes')
@@ -1,7 +1,7 @@
 """Atlas Scientific I2C Drivers for Raspberry PI & MicroPython"""
 
 
-from meerkat.base import I2C, time
+from meerkat.base import I2C, time, asyncio
 from meerkat.data import Meta, CSVWriter, JSONWriter
 
 
@@ -63,13 +63,13 @@ class Atlas:
         self.metadata.accuracy  = None 
         self.metadata.precision = None
         
-        self.metadata.bus_n = bus_n
+        self.metadata.bus_n = getattr(i2c_bus, 'bus_n', None)
         self.metadata.bus_addr = hex(bus_addr)
 
         # data recording method
         self.writer_output = output
-        self.csv_writer = CSVWriter(metadata=self.metadata, time_source='std_time_ms')
-        self.json_writer = JSONWriter(metadata=self.metadata, time_source='std_time_ms')
+        self.csv_writer = CSVWriter(metadata=self.metadata, time_source='local')
+        self.json_writer = JSONWriter(metadata=self.metadata, time_source='local')
         
         
         
@@ -99,6 +99,32 @@ class Atlas:
         str : response, may require further parsing
         """
 
+        self._query_write(command, verbose)
+
+        if delay is not None:
+            time.sleep(delay/1000)
+
+        if n != 0:
+            return self._query_read(n, verbose)
+
+    async def query_async(self, command, n=31, delay=None, verbose=False):
+        """Write a command to the i2c device and read the reply, awaiting
+        the delay instead of blocking. See self.query for parameters.
+
+        Returns
+        -------
+        str : response, may require further parsing
+        """
+        self._query_write(command, verbose)
+
+        if delay is not None:
+            await asyncio.sleep(delay/1000)
+
+        if n != 0:
+            return self._query_read(n, verbose)
+
+    def _query_write(self, command, verbose=False):
+        """Write a command to the i2c device, see self.query"""
         if verbose:
             print("Input Type: ", type(command))
 
@@ -112,34 +138,32 @@ class Atlas:
 
         self.bus.write_n_bytes(*[byte_command])
 
-        if delay is not None:
-            time.sleep(delay/1000)
+    def _query_read(self, n, verbose=False):
+        """Read and trim a reply from the i2c device, see self.query"""
+        reply = self.bus.read_n_bytes(n=n)
 
-        if n != 0:
-            reply = self.bus.read_n_bytes(n=n)
+        reply_mapper = {0: 'Filler',
+                        1: 'Success',
+                        254: 'Still processing',
+                        255: 'No data'}
 
-            reply_mapper = {0: 'Filler',
-                            1: 'Success',
-                            254: 'Still processing',
-                            255: 'No data'}
-
-            if verbose:
-                # print the response code that is in position 0 of reply
-                reply_0 = reply[0]
-                print("Reply:", reply_mapper[reply_0])
-
-            # filter out response codes and filler bytes
-            reply_bytes = bytearray([])
-            for reply_n in reply:
-                if reply_n not in [0x0, 0x1, 0x2, 0x254, 0x255]:
-                    reply_bytes.append(reply_n)
-            reply_bytes = bytes(reply_bytes)
-            reply_bytes = reply_bytes.decode('utf-8')
+        if verbose:
+            # print the response code that is in position 0 of reply
+            reply_0 = reply[0]
+            print("Reply:", reply_mapper[reply_0])
+
+        # filter out response codes and filler bytes
+        reply_bytes = bytearray([])
+        for reply_n in reply:
+            if reply_n not in [0x0, 0x1, 0x2, 0x254, 0x255]:
+                reply_bytes.append(reply_n)
+        reply_bytes = bytes(reply_bytes)
+        reply_bytes = reply_bytes.decode('utf-8')
 
-            if verbose:
-                print("Formatted and trimmed reply:", reply_bytes)
+        if verbose:
+            print("Formatted and trimmed reply:", reply_bytes)
 
-            return reply_bytes
+        return reply_bytes
 
     def led_on(self):
         """Turn on status LED until another character is set"""
@@ -306,9 +330,54 @@ class Atlas:
             wr.write([description, m] + measure)
             time.sleep(max(self.long_delay, delay))
 
+    async def get_async(self, description='no_description', n=1, delay=0):
+        """Get formatted output, awaiting measurement and delay times.
+        Assumes subclass has method 'measure_async'. See self.get for
+        parameters and return values."""
+
+        data_list = []
+        for m in range(n):
+            measure = await self.measure_async()
+            if isinstance(measure, float):
+                measure = [measure]
+            data = [description, m] + measure
+            data_list.append(data)
+            if n == 1:
+                return data_list[0]
+            await asyncio.sleep(max(self.long_delay, delay))
+        return data_list
+
+    async def publish_async(self, description='NA', n=1, delay=0):
+        """Output data in JSON, awaiting measurement and delay times.
+        See self.publish for parameters and return values."""
+        data_list = []
+        for m in range(n):
+            measure = await self.measure_async()
+            if isinstance(measure, float):
+                measure = [measure]
+            data_list.append(self.json_writer.publish([description, m] + measure))
+            if n == 1:
+                return data_list[0]
+            await asyncio.sleep(max(self.long_delay, delay))
+        return data_list
+
+    async def write_async(self, description='NA', n=1, delay=0):
+        """Format output and save to file, awaiting measurement and
+        delay times. See self.write for parameters."""
+        wr = {"csv": self.csv_writer,
+              "json": self.json_writer}[self.writer_output]
+        for m in range(n):
+            measure = await self.measure_async()
+            if ((isinstance(measure, float)) or
+                (isinstance(measure, int)) or
+                (isinstance(measure, str))):
+                    measure = [measure]
+            wr.write([description, m] + measure)
+            await asyncio.sleep(max(self.long_delay, delay))
+
 class pH(Atlas):
-    def __init__(self, bus_n, bus_addr=0x63, output='csv', name='atlas_ph'):
-        super().__init__(bus_n=bus_n, bus_addr=bus_addr, output=output, name=name)
+    def __init__(self, i2c_bus, bus_addr=0x63, output='csv', name='atlas_ph'):
+        super().__init__(i2c_bus=i2c_bus, bus_addr=bus_addr, output=output, name=name)
         
         self.metadata.description = 'Atlas pH'
         self.metadata.urls = 'www.atlas-scientific.com/ph.html'
@@ -447,13 +516,21 @@ class pH(Atlas):
         _r = float(_r)
         return _r
 
+    async def measure_async(self, verbose=False):
+        """Take a pH measurement, awaiting the conversion time.
+        See self.measure"""
+
+        _r = await self.query_async(b'R', n=7, delay=950, verbose=verbose)
+        _r = float(_r)
+        return _r
+
 class Oxygen(Atlas):
     def __init__(self):
         pass
 
 class Conductivity(Atlas):
-    def __init__(self, bus_n, bus_addr=0x64, output='csv', name='atlas_conductivity'):
-        super().__init__(bus_n=bus_n, bus_addr=bus_addr, output=output, name=name)
+    def __init__(self, i2c_bus, bus_addr=0x64, output='csv', name='atlas_conductivity'):
+        super().__init__(i2c_bus=i2c_bus, bus_addr=bus_addr, output=output, name=name)
 
         self.measure_mapper = {'EC':  ['conductivity', 'float', 'uS/cm', '+/-2%'], 
                                'TDS': ['total_dissolved_solids', 'float', 'ppm', '+/-2%'],
@@ -685,3 +762,11 @@ class Conductivity(Atlas):
         _r = self.query(b'R', n=40, delay=650, verbose=verbose)
         _r = [m for m in _r.split(',')]
         return _r
+
+    async def measure_async(self, verbose=False):
+        """Take a Conductivity measurement, awaiting the conversion time.
+        See self.measure"""
+
+        _r = await self.query_async(b'R', n=40, delay=650, verbose=verbose)
+        _r = [m for m in _r.split(',')]
+        return _r
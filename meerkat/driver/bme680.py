@@ -11,10 +11,29 @@ QWIIC pinout version:
 https://www.sparkfun.com/products/14570
 """
 
-from meerkat.base import time, struct
+from meerkat.base import time, struct, asyncio
 from meerkat.data import Meta, CSVWriter, JSONWriter
 
 
+# field data block, 0x1D to 0x2B, read in one transaction
+FIELD_DATA_REG = 0x1D
+FIELD_DATA_LEN = 15
+
+# offsets of values in the field data block
+_MEAS_STATUS = 0x1D - FIELD_DATA_REG
+_PRESS = 0x1F - FIELD_DATA_REG
+_TEMP = 0x22 - FIELD_DATA_REG
+_HUM = 0x25 - FIELD_DATA_REG
+_GAS_R = 0x2A - FIELD_DATA_REG
+
+
+# measurement cycles for each oversampling register value, see
+# bme68x_get_meas_dur in the Bosch BME68x API
+_OS_CYCLES = (0, 1, 2, 4, 8, 16, 16, 16)
+
+_clock = getattr(time, 'monotonic', time.time)
+
+
 def _read24(arr):
     """Parse an unsigned 24-bit value as a floating point and return it."""
     ret = 0.0
@@ -90,6 +109,14 @@ class BME680:
         self._r_ctrl_meas = None
         self._r_ctrl_gas_1 = None
 
+        # gas_wait register values by profile number, read on first use
+        self._gas_wait = {}
+
+        # measurement completion, see self.measure
+        self.poll_interval = 0.002  # seconds between status checks
+        self.measure_timeout = 0.5  # seconds past the conversion time
+        self._t_forced = None       # when forced_mode was last set
+
         # the datasheet gives two options: float or int values and equations
         # this code uses integer calculations, see table 16
         self._const_array1_int = (2147483647, 2147483647,
@@ -118,6 +145,7 @@ class BME680:
         # sample collection metadata
         self._last_reading = 0
         self._min_refresh_time = 1 / self.refresh_rate
+        self._field_buffer = bytearray(FIELD_DATA_LEN)
 
         # information about this device
         self.metadata = Meta(name=sensor_id)
@@ -138,8 +166,8 @@ class BME680:
 
         # data recording method
         self.writer_output = output
-        self.csv_writer   = CSVWriter(metadata=self.metadata, time_source='std_time_ms')
-        self.json_writer = JSONWriter(metadata=self.metadata, time_source='std_time_ms')
+        self.csv_writer   = CSVWriter(metadata=self.metadata, time_source='local')
+        self.json_writer = JSONWriter(metadata=self.metadata, time_source='local')
 
     def read_calibration(self):
         """Read chip calibration coefficients
@@ -293,6 +321,7 @@ class BME680:
         """Set chip mode to Forced Mode (active for measurement)"""
         self.mode = 0b01
         self.write_r_ctrl_meas()
+        self._t_forced = _clock()
 
     def sleep_mode(self):
         """Set chip mode to Sleep Mode"""
@@ -338,6 +367,7 @@ class BME680:
         value : int, value for register
         """
         self.set_x_register(reg_0=0x64, n=n, value=value)
+        self._gas_wait[n] = value
 
     def set_res_heat(self, n, value):
         """Set resistance for the heater registers.
@@ -435,6 +465,47 @@ class BME680:
         x = mapper[x]
         return (x << 6) | t
 
+    @staticmethod
+    def gas_wait_time(value):
+        """Decode a gas_wait register value, see self.calc_wait_time
+
+        Returns
+        -------
+        int, heater wait time in milliseconds
+        """
+        return (value & 0b111111) * (1, 4, 16, 64)[value >> 6]
+
+    def conversion_time(self):
+        """Calculate the time a forced mode measurement takes from the
+        oversampling settings and, if the gas measurement is on, the gas
+        wait time of the selected heater profile.  See bme68x_get_meas_dur
+        in the Bosch BME68x API.
+
+        Returns
+        -------
+        float, seconds
+        """
+        cycles = (_OS_CYCLES[self.osrs_t] + _OS_CYCLES[self.osrs_p] +
+                  _OS_CYCLES[self.osrs_h])
+        us = cycles * 1963
+        us += 477 * 4  # TPH switching
+        us += 477 * 5  # gas measurement
+        us += 500      # wake up
+        t = us / 1e6 + 0.001
+        if self.run_gas:
+            n = self.nb_conv
+            if n not in self._gas_wait:
+                self._gas_wait[n] = self.bus.read_register_8bit(0x64 + n)
+            t += self.gas_wait_time(self._gas_wait[n]) / 1000
+        return t
+
+    def _measure_wait(self):
+        """Seconds until the measurement started by forced_mode is
+        expected to finish"""
+        if self._t_forced is None:
+            return 0
+        return max(0, self._t_forced + self.conversion_time() - _clock())
+
     def get_measurement_status(self):
         reg_meas_status = self.bus.read_register_8bit(0x1D)
         self.gas_meas_index = reg_meas_status & 0b1111
@@ -443,50 +514,87 @@ class BME680:
         self._measuring = (reg_meas_status >> 5) & 0b1
 
     def measure(self, verbose=False):
-        """Get the temperature, pressure and humidity"""
+        """Get the temperature, pressure and humidity.  Sleeps once for
+        the expected conversion time after forced_mode, then checks the
+        status every self.poll_interval seconds until new data is ready
+        or self.measure_timeout seconds have passed.
+
+        Returns
+        -------
+        bool, True if new data was read, False on timeout
+        """
         self._new_data = 0
 
-        t0 = time.time()
+        time.sleep(self._measure_wait())
+        t_end = _clock() + self.measure_timeout
         cx = 1
         while True:
             self.get_measurement_status()
-            dt = (time.time() - t0)
-
-            if self._measuring == 1:
-                if verbose:
-                    print('Still measuring, waiting 1 second...')
-                time.sleep(1)
-
-            elif self._new_data == 1:
+            if self._new_data == 1:
                 if verbose:
                     print('New data found!')
                 break
-
-            elif dt > 5:
+            elif _clock() > t_end:
                 if verbose:
                     print('Timeout waiting for new data :(')
                 return False
             if verbose:
                 print('While loop %s' % cx)
             cx += 1
+            time.sleep(self.poll_interval)
 
-        data = self.bus.read_register_nbyte(0x1F, 3)  # 0x1F
-        self._adc_pres = ((data[0] << 16) + (data[1] << 8) + data[2]) >> 4
+        self._t_forced = None
+        self._read_field_data()
+        return True
 
-        data = self.bus.read_register_nbyte(0x22, 3)  # 0x22
-        self._adc_temp = ((data[0] << 16) + (data[1] << 8) + data[2]) >> 4
+    async def measure_async(self, verbose=False):
+        """Get the temperature, pressure and humidity, awaiting
+        the measurement instead of blocking. See self.measure"""
+        self._new_data = 0
 
-        data = self.bus.read_register_nbyte(0x25, 3)  # 0x25
-        self._adc_hum = (data[0] << 8) + data[1]
+        await asyncio.sleep(self._measure_wait())
+        t_end = _clock() + self.measure_timeout
+        while True:
+            self.get_measurement_status()
+            if self._new_data == 1:
+                break
+            elif _clock() > t_end:
+                if verbose:
+                    print('Timeout waiting for new data :(')
+                return False
+            await asyncio.sleep(self.poll_interval)
+
+        self._t_forced = None
+        self._read_field_data()
+        return True
 
-        _gas_r_msb  = self.bus.read_register_8bit(0x2A)
-        _gas_r_lsb  = self.bus.read_register_8bit(0x2B)
+    def _read_field_data(self):
+        """Read the raw pressure, temperature, humidity and gas ADC values
+        in one burst read of the field data block, so all values come from
+        the same measurement"""
+        data = self._field_buffer
+        if hasattr(self.bus, 'read_register_into'):
+            self.bus.read_register_into(FIELD_DATA_REG, data)
+        else:
+            data[:] = self.bus.read_register_nbyte(FIELD_DATA_REG, FIELD_DATA_LEN)
+
+        self._new_data = data[_MEAS_STATUS] >> 7
+        self.gas_meas_index = data[_MEAS_STATUS] & 0b1111
+
+        i = _PRESS
+        self._adc_pres = ((data[i] << 16) + (data[i+1] << 8) + data[i+2]) >> 4
+        i = _TEMP
+        self._adc_temp = ((data[i] << 16) + (data[i+1] << 8) + data[i+2]) >> 4
+        i = _HUM
+        self._adc_hum = (data[i] << 8) + data[i+1]
+
+        _gas_r_msb = data[_GAS_R]
+        _gas_r_lsb = data[_GAS_R+1]
 
         self._adc_gas = (_gas_r_msb << 2) + (_gas_r_lsb >> 6)
         self._gas_valid = (_gas_r_lsb >> 5) & 0b1
         self._heat_stab = (_gas_r_lsb >> 4) & 0b1
         self._gas_range = _gas_r_lsb & 0b1111  # 0x2B <3:0>
-        return True
 
     def gas(self):
         """Calculate the gas resistance in ohms"""
@@ -576,10 +684,23 @@ class BME680:
             heat_stable : int, gas heater is stable
         """
         self.forced_mode()
-        time.sleep(0.2)
 
         if not self.measure(verbose):
             return False
+        return self._compensated(description, n)
+
+    async def get_async(self, description='NA', n=1, verbose=False):
+        """Get one sample of data, awaiting the measurement instead of
+        blocking. See self.get for parameters and return values."""
+        self.forced_mode()
+
+        if not await self.measure_async(verbose):
+            return False
+        return self._compensated(description, n)
+
+    def _compensated(self, description, n):
+        """Calculate compensated values from the last raw ADC values
+        and format them as one row of data, see self.get"""
         t = self.temperature()
         p = self.pressure()
         h = self.humidity()
@@ -617,6 +738,13 @@ class BME680:
         json_data = self.json_writer.publish(data)
         return json_data
 
+    async def publish_async(self, description='NA', verbose=False):
+        """Get one sample of data in JSON, awaiting the measurement
+        instead of blocking. See self.publish"""
+        data = await self.get_async(description=description, verbose=verbose)
+        json_data = self.json_writer.publish(data)
+        return json_data
+
 
     def write(self, description='NA', n=1, delay=None):
         """Format output and save to file, formatted as either .csv or .json.
@@ -646,3 +774,14 @@ class BME680:
             wr.write(data)
             if delay is not None:
                 time.sleep(delay)
+
+    async def write_async(self, description='NA', n=1, delay=None):
+        """Format output and save to file, awaiting measurement and
+        delay times. See self.write for parameters."""
+        wr = {"csv": self.csv_writer,
+              "json": self.json_writer}[self.writer_output]
+        for m in range(n):
+            data = await self.get_async(description=description)
+            wr.write(data)
+            if delay is not None:
+                await asyncio.sleep(delay)
@@ -73,8 +73,8 @@ class DS3231:
         # note: using millisecond accuracy on driver timestamp, even though
         # RTC is only 1 second resolution
         self.writer_output = output
-        self.csv_writer = CSVWriter(metadata=self.metadata, time_source='std_time_ms')
-        self.json_writer = JSONWriter(metadata=self.metadata, time_source='std_time_ms')
+        self.csv_writer = CSVWriter(metadata=self.metadata, time_source='local')
+        self.json_writer = JSONWriter(metadata=self.metadata, time_source='local')
         
     def set_time(self, YY, MM, DD, hh, mm, ss, micro, tz):
         """Set time of RTC
@@ -61,7 +61,7 @@ class INA219:
         self.metadata.precision = [None, 1, '4 mV', '10uV accross shunt']
         self.metadata.accuracy_note = 'values for model INA291A'
         
-        self.metadata.bus_n = bus_n
+        self.metadata.bus_n = getattr(i2c_bus, 'bus_n', None)
         self.metadata.bus_addr = hex(bus_addr)
 
         # chip defaults on power up or reset command
@@ -92,8 +92,8 @@ class INA219:
         
         # data recording method
         self.writer_output = output
-        self.csv_writer = CSVWriter(metadata=self.metadata, time_source='std_time_ms')
-        self.json_writer = JSONWriter(metadata=self.metadata, time_source='std_time_ms')
+        self.csv_writer = CSVWriter(metadata=self.metadata, time_source='local')
+        self.json_writer = JSONWriter(metadata=self.metadata, time_source='local')
         
         # intialized configuration values
         self.get_config()
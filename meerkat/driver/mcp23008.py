@@ -6,7 +6,7 @@ https://www.microchip.com/wwwproducts/en/MCP23008
 from meerkat.base import time
 from meerkat.data import Meta, CSVWriter, JSONWriter
 
-from meerkat import tools
+from meerkat.base import tools
 
 class MCP23008:
     
@@ -40,12 +40,12 @@ class MCP23008:
         self.metadata.accuracy  = None
         self.metadata.precision = None
         
-        self.metadata.bus_n = bus_n
+        self.metadata.bus_n = getattr(i2c_bus, 'bus_n', None)
         self.metadata.bus_addr = hex(bus_addr)
         
         self.writer_output = output
-        self.csv_writer = CSVWriter(metadata=self.metadata, time_source='std_time_ms')
-        self.json_writer = JSONWriter(metadata=self.metadata, time_source='std_time_ms')
+        self.csv_writer = CSVWriter(metadata=self.metadata, time_source='local')
+        self.json_writer = JSONWriter(metadata=self.metadata, time_source='local')
         
     def get_all_channels(self):
         """Get all channel states, as a single 8 bit value. Each bit 
@@ -76,13 +76,13 @@ class MCP4728(object):
         self.metadata.accuracy  = None
         self.metadata.precision = 'vref: gain 1 = 0.5mV/LSB, gain 2 = 1mV/LSB; vdd: vdd/4096'
 
-        self.metadata.bus_n    = bus_n
+        self.metadata.bus_n    = getattr(i2c_bus, 'bus_n', None)
         self.metadata.bus_addr = hex(bus_addr)
 
         # data recording method
         self.writer_output = output
-        self.csv_writer  = CSVWriter(metadata=self.metadata,  time_source='std_time_ms')
-        self.json_writer = JSONWriter(metadata=self.metadata, time_source='std_time_ms')
+        self.csv_writer  = CSVWriter(metadata=self.metadata,  time_source='local')
+        self.json_writer = JSONWriter(metadata=self.metadata, time_source='local')
 
 
     def general_call_reset(self):
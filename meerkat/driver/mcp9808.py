@@ -68,13 +68,13 @@ class MCP9808(object):
         self.metadata.accuracy  = [None, 1, '+/- 0.25 typical'] 
         self.metadata.precision = [None, 1, '0.0625 max']
         
-        self.metadata.bus_n = bus_n
+        self.metadata.bus_n = getattr(i2c_bus, 'bus_n', None)
         self.metadata.bus_addr = hex(bus_addr)
 
         # data recording method
         self.writer_output = output
-        self.csv_writer = CSVWriter(metadata=self.metadata, time_source='std_time_ms')
-        self.json_writer = JSONWriter(metadata=self.metadata, time_source='std_time_ms')
+        self.csv_writer = CSVWriter(metadata=self.metadata, time_source='local')
+        self.json_writer = JSONWriter(metadata=self.metadata, time_source='local')
         
     def set_pointer(self, reg_name):
         """Set the pointer register address
@@ -28,6 +28,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+from meerkat.base import time, struct
 from meerkat.data import Meta, CSVWriter, JSONWriter
 
 
@@ -62,6 +63,17 @@ class mpu6050:
     GYRO_RANGE_1000DEG = 0x10
     GYRO_RANGE_2000DEG = 0x18
 
+    # Range register values to scale modifiers
+    ACCEL_SCALE_MODIFIERS = {ACCEL_RANGE_2G: ACCEL_SCALE_MODIFIER_2G,
+                             ACCEL_RANGE_4G: ACCEL_SCALE_MODIFIER_4G,
+                             ACCEL_RANGE_8G: ACCEL_SCALE_MODIFIER_8G,
+                             ACCEL_RANGE_16G: ACCEL_SCALE_MODIFIER_16G}
+
+    GYRO_SCALE_MODIFIERS = {GYRO_RANGE_250DEG: GYRO_SCALE_MODIFIER_250DEG,
+                            GYRO_RANGE_500DEG: GYRO_SCALE_MODIFIER_500DEG,
+                            GYRO_RANGE_1000DEG: GYRO_SCALE_MODIFIER_1000DEG,
+                            GYRO_RANGE_2000DEG: GYRO_SCALE_MODIFIER_2000DEG}
+
     # MPU-6050 Registers
     PWR_MGMT_1 = 0x6B
     PWR_MGMT_2 = 0x6C
@@ -79,6 +91,25 @@ class mpu6050:
     ACCEL_CONFIG = 0x1C
     GYRO_CONFIG = 0x1B
 
+    # FIFO Registers
+    SMPLRT_DIV = 0x19
+    CONFIG = 0x1A
+    FIFO_EN = 0x23
+    USER_CTRL = 0x6A
+    FIFO_COUNTH = 0x72
+    FIFO_R_W = 0x74
+
+    # FIFO_EN register bits, FIFO frames are written in register order
+    FIFO_EN_TEMP = 0x80
+    FIFO_EN_GYRO = 0x70
+    FIFO_EN_ACCEL = 0x08
+
+    # USER_CTRL register bits
+    USER_CTRL_FIFO_EN = 0x40
+    USER_CTRL_FIFO_RESET = 0x04
+
+    FIFO_SIZE = 1024
+
     def __init__(self, i2c_bus, bus_addr=0x68, output='csv', name='MPU6050'):
         """Initialize Target device on i2c bus.
 
@@ -119,13 +150,30 @@ class mpu6050:
         self.metadata.accel_precision = '16bit'
         self.metadata.accel_noise = 'PSD 400 ug / Hz**1/2'
         
-        self.metadata.bus_n = bus_n
+        self.metadata.bus_n = getattr(i2c_bus, 'bus_n', None)
         self.metadata.bus_addr = hex(bus_addr)
 
+        # burst read of all output registers, see self.get_burst
+        self.burst = True
+        self._burst_buffer = bytearray(14)
+
+        # FIFO streaming state, see self.fifo_start
+        self.fifo_rate = None          # samples per second
+        self.fifo_temperature = False  # temperature included in FIFO frames
+        self.fifo_overflows = 0        # count of FIFO overflows detected
+        self._fifo_frame_size = None   # bytes per FIFO frame
+        self._fifo_buffer = bytearray(self.FIFO_SIZE)
+        self._fifo_t0 = None           # time of the first FIFO sample
+        self._fifo_n = 0               # FIFO samples read since self._fifo_t0
+
+        # cached scale modifiers, read from the device once
+        self._accel_scale = None
+        self._gyro_scale = None
+
         # data recording classes
         self.writer_output = output
-        self.csv_writer = CSVWriter(metadata=self.metadata, time_source='std_time_ms')
-        self.json_writer = JSONWriter(metadata=self.metadata, time_source='std_time_ms')
+        self.csv_writer = CSVWriter(metadata=self.metadata, time_source='local')
+        self.json_writer = JSONWriter(metadata=self.metadata, time_source='local')
         
     # I2C communication methods
 
@@ -166,6 +214,8 @@ class mpu6050:
         """
 
         self.accel_range = accel_range
+        self._accel_scale = self.ACCEL_SCALE_MODIFIERS.get(accel_range,
+                                                           self.ACCEL_SCALE_MODIFIER_2G)
 
         # First change it to 0x00 to make sure we write the correct value later
         self.bus.write_register_16bit(self.ACCEL_CONFIG, 0x00)
@@ -244,6 +294,8 @@ class mpu6050:
         """
 
         self.gyro_range = gyro_range
+        self._gyro_scale = self.GYRO_SCALE_MODIFIERS.get(gyro_range,
+                                                         self.GYRO_SCALE_MODIFIER_250DEG)
 
         # First change it to 0x00 to make sure we write the correct value later
         self.bus.write_register_16bit(self.GYRO_CONFIG, 0x00)
@@ -306,6 +358,174 @@ class mpu6050:
 
         return x, y, z
 
+    def read_scales(self):
+        """Read the accelerometer and gyroscope range registers once and
+        cache the scale modifiers used by self.get_burst.  Called
+        automatically on the first burst read, and not needed after
+        self.set_accel_range or self.set_gyro_range.
+        """
+        accel_range = self.bus.read_register_8bit(self.ACCEL_CONFIG) & 0x18
+        gyro_range = self.bus.read_register_8bit(self.GYRO_CONFIG) & 0x18
+        self._accel_scale = self.ACCEL_SCALE_MODIFIERS[accel_range]
+        self._gyro_scale = self.GYRO_SCALE_MODIFIERS[gyro_range]
+
+    def get_burst(self, g=False):
+        """Read the accelerometer, temperature and gyroscope output
+        registers ACCEL_XOUT_H through GYRO_ZOUT_L (14 bytes) in one
+        transaction, so all values are from the same sample.
+
+        If g is True, acceleration will be in g
+        If g is False, acceleration will be in m/s^2
+
+        Returns
+        -------
+        ax, ay, az : float, acceleration
+        temp : float, temperature in degrees Celcius
+        gx, gy, gz : float, rotation in degrees per second
+        """
+        if (self._accel_scale is None) or (self._gyro_scale is None):
+            self.read_scales()
+
+        self.bus.read_register_into(self.ACCEL_XOUT0, self._burst_buffer)
+        ax, ay, az, t, gx, gy, gz = struct.unpack('>7h', self._burst_buffer)
+
+        a_scale = self._accel_scale
+        if g is False:
+            a_scale = a_scale / self.GRAVITIY_MS2
+        g_scale = self._gyro_scale
+
+        return (ax / a_scale, ay / a_scale, az / a_scale,
+                (t / 340.0) + 36.53,
+                gx / g_scale, gy / g_scale, gz / g_scale)
+
+    def _get_accel_gyro(self):
+        """Get acceleration in m/s^2 and rotation in deg/s as one list,
+        using a burst read if self.burst is True"""
+        if self.burst:
+            d = self.get_burst()
+            return [d[0], d[1], d[2], d[4], d[5], d[6]]
+        return list(self.get_accel()) + list(self.get_gyro())
+
+    def fifo_start(self, rate=1000, dlpf=1, temperature=False):
+        """Configure the sample rate and start writing samples to the FIFO.
+
+        Sample rate = gyroscope output rate / (1 + SMPLRT_DIV), where the
+        gyroscope output rate is 8 kHz with the digital low pass filter
+        disabled (dlpf = 0 or 7) and 1 kHz otherwise.
+
+        Parameters
+        ----------
+        rate : int, target samples per second, actual rate is set in
+            self.fifo_rate
+        dlpf : int, digital low pass filter setting DLPF_CFG, 0-7
+        temperature : bool, include temperature in FIFO frames
+        """
+        if (self._accel_scale is None) or (self._gyro_scale is None):
+            self.read_scales()
+
+        self.bus.write_register_8bit(self.CONFIG, dlpf & 0b111)
+
+        gyro_rate = 8000 if dlpf in [0, 7] else 1000
+        div = min(max(int(round(gyro_rate / rate)) - 1, 0), 255)
+        self.bus.write_register_8bit(self.SMPLRT_DIV, div)
+        self.fifo_rate = gyro_rate / (1 + div)
+
+        fifo_en = self.FIFO_EN_ACCEL | self.FIFO_EN_GYRO
+        self.fifo_temperature = temperature
+        if temperature:
+            fifo_en = fifo_en | self.FIFO_EN_TEMP
+            self._fifo_frame_size = 14
+        else:
+            self._fifo_frame_size = 12
+
+        self.bus.write_register_8bit(self.FIFO_EN, fifo_en)
+        self.fifo_reset()
+
+    def fifo_stop(self):
+        """Stop writing samples to the FIFO"""
+        self.bus.write_register_8bit(self.FIFO_EN, 0x00)
+        self.bus.write_register_8bit(self.USER_CTRL, 0x00)
+
+    def fifo_reset(self):
+        """Clear the FIFO and restart timestamp reconstruction"""
+        self.bus.write_register_8bit(self.USER_CTRL, self.USER_CTRL_FIFO_RESET)
+        self.bus.write_register_8bit(self.USER_CTRL, self.USER_CTRL_FIFO_EN)
+        self._fifo_t0 = time.time()
+        self._fifo_n = 0
+
+    def fifo_count(self):
+        """Get the number of bytes in the FIFO"""
+        return self.bus.read_register_16bit(self.FIFO_COUNTH)
+
+    def fifo_stream(self, n=None, poll_interval=0.01):
+        """Read the FIFO in chunks and yield decoded samples.  Timestamps
+        are reconstructed from the start time and self.fifo_rate.
+
+        If the FIFO fills, samples were lost and frame alignment is
+        unknown, so the FIFO is reset and self.fifo_overflows incremented.
+
+        Requires NumPy.  self.fifo_start must be called first.
+
+        Parameters
+        ----------
+        n : int, number of samples to yield before returning,
+            None to stream until the generator is closed
+        poll_interval : float, seconds to wait when the FIFO is empty
+
+        Yields
+        ------
+        t : numpy array, shape (m,), seconds since the epoch of each sample
+        data : numpy array, shape (m, 6) with columns ax, ay, az in m/s^2
+            and gx, gy, gz in deg/s, or shape (m, 7) with temperature in
+            degrees Celcius as the fourth column if self.fifo_temperature
+        """
+        import numpy as np
+
+        fs = self._fifo_frame_size
+        frames_per_read = self.FIFO_SIZE // fs
+
+        a_scale = self.GRAVITIY_MS2 / self._accel_scale
+        g_scale = 1 / self._gyro_scale
+        if self.fifo_temperature:
+            scale = np.array([a_scale] * 3 + [1 / 340.0] + [g_scale] * 3)
+            offset = np.array([0.0] * 3 + [36.53] + [0.0] * 3)
+        else:
+            scale = np.array([a_scale] * 3 + [g_scale] * 3)
+            offset = 0.0
+
+        # one view of the FIFO buffer per frame count, so the bus can reuse
+        # the read transaction built on it
+        views = {}
+
+        yielded = 0
+        while (n is None) or (yielded < n):
+            count = self.fifo_count()
+            if count >= self.FIFO_SIZE:
+                self.fifo_overflows += 1
+                self.fifo_reset()
+                continue
+
+            frames = count // fs
+            if n is not None:
+                frames = min(frames, n - yielded)
+            if frames == 0:
+                time.sleep(poll_interval)
+                continue
+            frames = min(frames, frames_per_read)
+
+            buf = views.get(frames)
+            if buf is None:
+                buf = memoryview(self._fifo_buffer)[:frames * fs]
+                views[frames] = buf
+            self.bus.read_register_into(self.FIFO_R_W, buf)
+            raw = np.frombuffer(buf, dtype='>i2').reshape(frames, fs // 2)
+            data = raw * scale + offset
+
+            t = self._fifo_t0 + (self._fifo_n + np.arange(frames)) / self.fifo_rate
+            self._fifo_n += frames
+            yielded += frames
+            yield t, data
+
     def get_all(self):
         """Reads and returns all the available data."""
         temp  = self.get_temp()
@@ -332,9 +552,7 @@ class mpu6050:
         """
         data_list = []
         for m in range(1, n+1):
-            data_list.append([description, m] + 
-                             list(self.get_accel()) + 
-                             list(self.get_gyro()))
+            data_list.append([description, m] + self._get_accel_gyro())
             if n == 1:
                 return data_list[0]
             if delay is not None:
@@ -358,9 +576,8 @@ class mpu6050:
         """
         data_list = []
         for m in range(n):
-            data_list.append(self.json_writer.publish([description, m] + 
-                             list(self.get_accel()) + 
-                             list(self.get_gyro())))
+            data_list.append(self.json_writer.publish([description, m] +
+                                                      self._get_accel_gyro()))
             if n == 1:
                 return data_list[0]
             if delay is not None:
@@ -387,8 +604,6 @@ class mpu6050:
         wr = {"csv": self.csv_writer,
               "json": self.json_writer}[self.writer_output]
         for m in range(n):
-            wr.write([description, m] + 
-                     list(self.get_accel()) + 
-                     list(self.get_gyro()))
+            wr.write([description, m] + self._get_accel_gyro())
             if delay is not None:
                 time.sleep(delay)
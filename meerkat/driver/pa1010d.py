@@ -11,19 +11,28 @@ https://www.cdtop-tech.com/products/pa1010d
 
 import re
 
+try:
+    from collections import deque
+except ImportError:
+    from ucollections import deque
+
 from meerkat.base import time
 from meerkat.data import Meta, CSVWriter, JSONWriter
+from meerkat.data import nmea
 
 
 regex = re.compile("[\r\n]")
 
+_clock = getattr(time, 'monotonic', time.time)
+
+# longest NMEA sentence is 82 characters, anything longer without a line
+# end is not a sentence
+_max_sentence = 82
+
 
 def calc_checksum(s):
-    """NMEA checksum calculation"""
-    checksum = 0
-    for char in s:
-        checksum ^= ord(char)
-    return "{:02x}".format(checksum).upper()
+    """NMEA checksum calculation, see meerkat.data.nmea.checksum"""
+    return nmea.checksum(s)
 
 
 class PA1010D:
@@ -46,6 +55,17 @@ class PA1010D:
 
         # maximum data in buffer size
         self._bytes_per_burst = 255
+
+        # bytes after the last line end of the previous read
+        self._carry = b""
+
+        # background reader, see self.start_reader
+        self.latest = {}            # sentence type: (sentence, time.monotonic received)
+        self.history = None         # deque of recent (sentence, time.monotonic received)
+        self.checksum_errors = 0    # sentences dropped for a bad checksum
+        self.max_age = 10           # seconds a sentence in self.latest is used by self.get
+        self._reader = None
+        self._reader_stop = None
         
         # standard metadata information about this device
         self.metadata = Meta(name=name)
@@ -61,7 +81,7 @@ class PA1010D:
         self.metadata.accuracy  = None
         self.metadata.precision = '<3.0 meters'
         
-        self.metadata.bus_n            = bus_n
+        self.metadata.bus_n            = getattr(i2c_bus, 'bus_n', None)
         self.metadata.bus_addr         = hex(bus_addr)
         
         # custom metadata attributes
@@ -70,52 +90,129 @@ class PA1010D:
         # data recording method
         self.writer_output = output
         self.csv_writer = CSVWriter(metadata=self.metadata,
-                                    time_source='std_time_ms')
+                                    time_source='local')
         self.json_writer = JSONWriter(metadata=self.metadata,
-                                      time_source='std_time_ms')
+                                      time_source='local')
 
     def raw_get(self):
-        """Get byte data from the GPS module, filtered of blanks
-        and combining lines"""
-        
-        data = ""
-        _d = self.bus.read_n_bytes(n=self._bytes_per_burst)
-        _d = _d.decode("UTF-8")
-        data = "".join([data, _d])
+        """Get complete lines from the GPS module, in the order received.
+        A line split across reads is kept until the rest arrives in a
+        later call.
 
-        data = regex.split(data)
-        data = [_d for _d in data if _d != ""]
-        data = set(data)
+        Returns
+        -------
+        list of str, NMEA sentences, without checksum validation
+        """
+        _d = bytes(self.bus.read_n_bytes(n=self._bytes_per_burst))
+        lines = (self._carry + _d).split(b"\n")
+        self._carry = lines.pop()
+        if (len(self._carry) > _max_sentence) or (b"$" not in self._carry):
+            self._carry = b""
 
         data_out = []
-        last_line = ""
-        started = False
+        for line in lines:
+            line = line.strip()
+            if (len(line) == 0) or (line[0:1] != b"$"):
+                continue
+            try:
+                data_out.append(line.decode())
+            except UnicodeError:
+                continue
+        return data_out
 
-        for line in data:
-            if (line[0] == "$") & ("*" in line):
-                data_out.append(line)
-            elif ("$" in line):
-                last_line = line
-            elif ("*" in line) & (last_line != ""):
-                data_out.append(last_line + line)
+    @staticmethod
+    def valid(sentence):
+        """Check the checksum of a NMEA sentence
 
-        return data_out
+        Parameters
+        ----------
+        sentence : str, NMEA sentence including '$' and '*' plus checksum
+
+        Returns
+        -------
+        bool, True if the checksum matches
+        """
+        return nmea.valid(sentence)
+
+    def read_sentences(self):
+        """Read the GPS module buffer until it is empty, keeping sentences
+        with a valid checksum in self.latest and self.history
+
+        Returns
+        -------
+        list of str, valid NMEA sentences in the order received
+        """
+        sentences = []
+        while True:
+            lines = self.raw_get()
+            t = _clock()
+            for line in lines:
+                if not self.valid(line):
+                    self.checksum_errors += 1
+                    continue
+                sentences.append(line)
+                self.latest[line[3:6]] = (line, t)
+                if self.history is not None:
+                    self.history.append((line, t))
+            # the module pads with line ends when it has no data
+            if len(lines) == 0:
+                return sentences
+
+    def _read_loop(self, interval):
+        while not self._reader_stop.is_set():
+            try:
+                self.read_sentences()
+            except OSError:
+                pass
+            self._reader_stop.wait(interval)
+
+    def start_reader(self, interval=0.1, history=100):
+        """Continuously read the GPS in a background thread, so that the
+        latest sentence of each type is always in self.latest.  If other
+        devices share the bus, use meerkat.base.i2c_pi.shared_device.
+
+        Parameters
+        ----------
+        interval : float, seconds to wait after the module buffer is empty
+        history : int, number of recent sentences kept in self.history
+        """
+        import threading
+        if self._reader is not None:
+            return
+        self.history = deque((), history)
+        self._reader_stop = threading.Event()
+        self._reader = threading.Thread(target=self._read_loop, args=(interval,), daemon=True)
+        self._reader.start()
+
+    def stop_reader(self):
+        """Stop the background reader"""
+        if self._reader is None:
+            return
+        self._reader_stop.set()
+        self._reader.join()
+        self._reader = None
         
-    def get(self, nmea_sentences=None, timeout=15):
+    def get(self, nmea_sentences=None, timeout=15, max_age=None):
         """Get NMEA sentences
         
         Parameters
         ----------
         nmea_sentence : list of str, NMEA sentence codes to return i.e. 'GSV'
         timeout : int, seconds to wait for data before returning
+        max_age : float, if the background reader is running, seconds after
+            a sentence was received that it is still returned.  Older
+            sentences are waited on as if not received.  Defaults to
+            self.max_age.
         
         Returns
         -------
-        list of str, NMEA sentences
+        list of str, NMEA sentences, False for each type not received
         """
         
         if nmea_sentences is None:
             nmea_sentences = self.metadata.supported_nmea_sentences
+        if max_age is None:
+            max_age = self.max_age
         
         check = {s: False for s in nmea_sentences}
         
@@ -123,16 +220,22 @@ class PA1010D:
         while sum([x == False for x in check.values()]) > 0:
             if time.time() - t0 > timeout:  # timeout in seconds
                 break
-            
-            for single_line in self.raw_get():
+
+            if self._reader is not None:
+                # the background reader keeps the latest sentences
+                now = _clock()
+                for s in nmea_sentences:
+                    latest = self.latest.get(s)
+                    if (latest is not None) and (now - latest[1] <= max_age):
+                        check[s] = latest[0]
+                if sum([x == False for x in check.values()]) > 0:
+                    time.sleep(0.1)
+                continue
+
+            for single_line in self.read_sentences():
                 sentence_type = single_line[3:6]
-                if (sentence_type in nmea_sentences) & ("*" in single_line):
-                    gps_data = single_line.split("*")
-                    gps_cs = gps_data[1]
-                    gps_data = gps_data[0][1:]
-                    driver_cs = calc_checksum(gps_data)
-                    if gps_cs == driver_cs:
-                        check[sentence_type] = single_line
+                if sentence_type in nmea_sentences:
+                    check[sentence_type] = single_line
                         
         return [v for k, v in check.items()]
         
@@ -0,0 +1,233 @@
+"""Find devices on an I2C bus and create their drivers
+
+Each known device type lists the addresses it can use and, where the chip
+has one, an ID register or command that confirms what it is.  discover
+scans the bus once, reads every ID register, then creates a driver for
+each address that matched.  Types are tried in order, so ID checked types
+come before types only known by address.
+
+Example, on Raspberry Pi:
+
+>>> from meerkat.base import I2C
+>>> from meerkat.driver import registry
+>>> i2c = I2C(bus_n=1, bus_addr=0x00)
+>>> drivers = registry.discover(i2c)
+>>> drivers
+{0x29: <TSL2591>, 0x62: <SCD4x>, 0x77: <BME680>}
+"""
+
+from meerkat.base import time
+from meerkat.driver import sensirion
+
+
+class DeviceType:
+    """One kind of I2C device and the driver that controls it"""
+    def __init__(self, name, driver, addresses, id_register=None, id_n=1,
+                 id_check=None, identify=None, kwargs=None):
+        """
+        Parameters
+        ----------
+        name : str, name of the device
+        driver : str, import path of the driver class,
+            e.g. 'meerkat.driver.bme680.BME680'
+        addresses : list of int, addresses the device can be set to
+        id_register : list of int, optional, ID registers to read
+        id_n : int, number of bytes to read from each ID register
+        id_check : callable, returns True if passed the ID bytes of
+            this device, in id_register order
+        identify : callable, optional, for IDs that can not be read in
+            one write then read.  Passed a bus instance set to the address,
+            returns True if it is this device.
+        kwargs : dict, optional, keyword arguments passed to the driver
+        """
+        self.name = name
+        self.driver = driver
+        self.addresses = addresses
+        self.id_register = id_register
+        self.id_n = id_n
+        self.id_check = id_check
+        self.identify = identify
+        self.kwargs = {} if kwargs is None else kwargs
+
+    def load(self):
+        """Import the driver class
+
+        Returns
+        -------
+        driver class
+        """
+        module, cls = self.driver.rsplit('.', 1)
+        return getattr(__import__(module, None, None, [cls]), cls)
+
+
+def identify_scd4x(bus):
+    """Read the SCD4x serial number and check its CRCs.  The sensor
+    does not answer while in periodic measurement mode."""
+    bus.write_n_bytes([0x36, 0x82])
+    time.sleep(0.01)
+    payload, failed = sensirion.check_frame(bus.read_n_bytes(9))
+    return len(payload) == 6 and len(failed) == 0
+
+
+def identify_atlas(device_type):
+    """Get an identify function that sends the Atlas Scientific 'i' info
+    command and checks the reply names device_type
+
+    Parameters
+    ----------
+    device_type : bytes, device code in the reply, e.g. b'pH' or b'EC'
+
+    Returns
+    -------
+    callable, see DeviceType identify
+    """
+    def identify(bus):
+        bus.write_n_bytes(b'i')
+        time.sleep(0.3)
+        d = bytes(bus.read_n_bytes(31))
+        return d[0] == 1 and (b'?I,' + device_type + b',') in d
+    return identify
+
+
+# known devices, in the order they are tried
+registry = [
+    DeviceType('BME680', 'meerkat.driver.bme680.BME680', [0x76, 0x77],
+               id_register=[0xD0], id_check=lambda d: d[0] == 0x61),
+    DeviceType('MCP9808', 'meerkat.driver.mcp9808.MCP9808', list(range(0x18, 0x20)),
+               id_register=[0x06, 0x07], id_n=2,
+               id_check=lambda d: d[0:2] == b'\x00\x54' and d[2] == 0x04),
+    DeviceType('TSL2591', 'meerkat.driver.tsl2591.TSL2591', [0x29],
+               id_register=[0xA0 | 0x12], id_check=lambda d: d[0] == 0x50),
+    DeviceType('MPU6050', 'meerkat.driver.mpu6050.mpu6050', [0x68, 0x69],
+               id_register=[0x75], id_check=lambda d: d[0] & 0x7E == 0x68),
+    DeviceType('SCD4x', 'meerkat.driver.scd4x.SCD4x', [0x62],
+               identify=identify_scd4x),
+    DeviceType('Atlas pH', 'meerkat.driver.atlas.pH', [0x61, 0x62, 0x63, 0x64],
+               identify=identify_atlas(b'pH')),
+    DeviceType('Atlas Conductivity', 'meerkat.driver.atlas.Conductivity',
+               [0x61, 0x62, 0x63, 0x64], identify=identify_atlas(b'EC')),
+    # known by address only
+    DeviceType('PA1010D', 'meerkat.driver.pa1010d.PA1010D', [0x10]),
+    DeviceType('MCP23008', 'meerkat.driver.mcp23008.MCP23008', [0x20]),
+    DeviceType('INA219', 'meerkat.driver.ina219.INA219', [0x40]),
+    DeviceType('ADS1115', 'meerkat.driver.ads.ADS1115', [0x48]),
+    DeviceType('MCP4728', 'meerkat.driver.mcp4728.MCP4728', [0x60]),
+    DeviceType('DS3231', 'meerkat.driver.ds3231.DS3231', [0x68]),
+    DeviceType('SPS30', 'meerkat.driver.sps30.SPS30', [0x69]),
+]
+
+
+def device(bus, bus_addr):
+    """Get a new bus instance for one address that shares the
+    controller of bus, since drivers set bus_addr on the instance they
+    are given
+
+    Parameters
+    ----------
+    bus : meerkat.base.I2C instance
+    bus_addr : int, address of Target device
+
+    Returns
+    -------
+    meerkat.base.I2C instance
+    """
+    if hasattr(bus, 'bus_n'):
+        return bus.__class__(bus.bus_n, bus_addr, controller=bus.bus)
+    dev = bus.__class__()
+    dev.bus_addr = bus_addr
+    return dev
+
+
+def read_ids(bus, addresses, types=None):
+    """Read the ID registers of every type that could be at each address,
+    with one write then read transaction per register.  These are not
+    combined into one I2C_RDWR transaction since many adapters, including
+    the Raspberry Pi, only accept a read as the last message.
+
+    Parameters
+    ----------
+    bus : meerkat.base.I2C instance
+    addresses : list of int, addresses found on the bus
+    types : list of DeviceType, defaults to registry
+
+    Returns
+    -------
+    dict, (address, DeviceType name): bytes read, or None if the read failed
+    """
+    types = registry if types is None else types
+    reads = [(a, t) for t in types if t.id_register is not None
+             for a in addresses if a in t.addresses]
+    ids = {}
+    for a, t in reads:
+        dev = device(bus, a)
+        try:
+            ids[(a, t.name)] = b''.join([bytes(dev.read_register_nbyte(r, t.id_n))
+                                         for r in t.id_register])
+        except OSError:
+            ids[(a, t.name)] = None
+    return ids
+
+
+def match(bus, addresses, types=None):
+    """Find the device type at each address
+
+    Parameters
+    ----------
+    bus : meerkat.base.I2C instance
+    addresses : list of int, addresses found on the bus
+    types : list of DeviceType, defaults to registry
+
+    Returns
+    -------
+    dict, address: DeviceType, addresses with no match are left out
+    """
+    types = registry if types is None else types
+    ids = read_ids(bus, addresses, types)
+    found = {}
+    for a in addresses:
+        for t in types:
+            if a not in t.addresses:
+                continue
+            if t.id_register is not None:
+                v = ids.get((a, t.name))
+                if v is None or not t.id_check(v):
+                    continue
+            elif t.identify is not None:
+                try:
+                    if not t.identify(device(bus, a)):
+                        continue
+                except OSError:
+                    continue
+            found[a] = t
+            break
+    return found
+
+
+def discover(bus, types=None, errors=None, **kwargs):
+    """Scan the bus and create a driver for each known device found.  A
+    driver that raises an exception is left out, the other drivers are
+    still created.
+
+    Parameters
+    ----------
+    bus : meerkat.base.I2C instance, on the bus to scan
+    types : list of DeviceType, defaults to registry
+    errors : dict, optional, filled with address: (DeviceType, exception)
+        for each driver that could not be created
+    kwargs : keyword arguments passed to every driver, e.g. output='json'
+
+    Returns
+    -------
+    dict, address: driver instance
+    """
+    addresses = [int(a, 16) if isinstance(a, str) else a for a in bus.scan()]
+    drivers = {}
+    for a, t in match(bus, addresses, types).items():
+        kw = dict(t.kwargs)
+        kw.update(kwargs)
+        try:
+            drivers[a] = t.load()(device(bus, a), bus_addr=a, **kw)
+        except Exception as e:
+            if errors is not None:
+                errors[a] = (t, e)
+    return drivers
@@ -2,64 +2,9 @@
 Chapter references (chr x.x) to Datasheet version '1.1 - April 2021'
 2021 Colin Dietrich"""
 
-from meerkat.base import time
+from meerkat.base import time, asyncio
 from meerkat.data import Meta, CSVWriter, JSONWriter
-
-
-def CRC_calc(data):
-    """Sensirion Common CRC checksum for 2-byte packets. See ch 3.11
-
-    Parameters
-    ----------
-    data : sequence of 2 bytes
-
-    Returns
-    -------
-    int, CRC check sum
-    """
-    crc = 0xFF
-    for i in range (0, 2):
-        crc = crc ^ data[i]
-        for j in range(8, 0, -1):
-            if crc & 0x80:
-                crc = (crc << 1) ^ 0x31
-            else:
-                crc = crc << 1
-    crc = crc & 0x0000FF
-    return crc
-
-def CRC_check(data, verbose=False):
-    """Apply the Sensirion Common CRC checksum for 2-byte packets
-    to a byte array. Check that all values received are uncorrupted
-    by matching the CRC checksum byte (third after 2 data bytes) and
-    returning the data bytes.
-
-    Parameters
-    ----------
-    data : sequence of data, 3 per data value where
-        bytes 0 and 1 are data
-        byte 2 is the CRC checksum bytes
-
-    Returns
-    -------
-    sequence of data values with checksum removed
-    or
-    None if sequence is corrupt and does not match checksum
-    """
-    d = []
-    for i in range(2, len(data), 3):
-        crc = data[i]
-        n0 = data[i-2]
-        n1 = data[i-1]
-        crc_calc = CRC_calc([n0, n1])
-        if verbose:
-            print('crc:', crc, 'crc_calc:', crc_calc)
-        if (crc_calc == crc):
-            d.append(n0)
-            d.append(n1)
-        else:
-            return d
-    return d
+from meerkat.driver.sensirion import CRC_calc, check_frame
 
 
 class SCD4x():
@@ -103,9 +48,15 @@ class SCD4x():
         self.sensor_id = sensor_id
         self.dt = None
 
+        # periodic measurement mode started by self.stream, None if idle
+        self.measuring = None
+
+        # count of words read that failed the CRC check
+        self.crc_failures = 0
+
         self.writer_output = output
-        self.csv_writer  = CSVWriter(metadata=self.metadata, time_source='std_time_ms')
-        self.json_writer = JSONWriter(metadata=self.metadata, time_source='std_time_ms')
+        self.csv_writer  = CSVWriter(metadata=self.metadata, time_source='local')
+        self.json_writer = JSONWriter(metadata=self.metadata, time_source='local')
 
     def metadata_update(self):
         """Get the configuration settings for this device
@@ -126,29 +77,125 @@ class SCD4x():
         co2 : int, CO2 concentration in ppm
         t : float, temperature in degrees Celsius
         rh : int, relative humidity in percent
+        each value is None if its word failed the CRC check
         """
         self.bus.write_n_bytes([0xEC, 0x05])
         time.sleep(0.002)
-        d = self.bus.read_n_bytes(9)
-        d = CRC_check(d)
+        co2, t, rh = self._read_words(3)
 
-        co2 = d[0] << 8 | d[1]
-        t   = d[2] << 8 | d[3]
-        rh  = d[4] << 8 | d[5]
-
-        t = -45 + 175 * t / 2**16
-        t   = round(t, 2)
-        rh = 100 * rh / 2**16
-        rh  = round(rh, 2)
+        if t is not None:
+            t = -45 + 175 * t / 2**16
+            t = round(t, 2)
+        if rh is not None:
+            rh = 100 * rh / 2**16
+            rh = round(rh, 2)
 
         d = [co2, t, rh]
         return d
 
+    def _read_words(self, n):
+        """Read n words and check the CRC of each
+
+        Parameters
+        ----------
+        n : int, number of 16 bit words to read
+
+        Returns
+        -------
+        list of int, one per word, None for each word that failed the CRC check
+        """
+        d, failed = check_frame(self.bus.read_n_bytes(3 * n))
+        words = [d[i] << 8 | d[i+1] for i in range(0, 2 * n, 2)]
+        if len(failed) > 0:
+            self.crc_failures += len(failed)
+            for w in failed:
+                words[w] = None
+        return words
+
     def stop_periodic_measurement(self):
         """Stop periodic measurement to change configuration or
         to save power. Note the sensor will only respond to other
         commands after waiting 500ms after this command. See Ch 3.5.3"""
         self.bus.write_n_bytes([0x3F, 0x86])
+        self.measuring = None
+
+    def poll(self):
+        """Read a measurement if one is ready, without waiting.
+        Periodic measurement must already be running.
+
+        Returns
+        -------
+        None if no data is ready, otherwise tuple of
+            t : float, seconds since the epoch when the data was read
+            data : list of co2, t and rh, see self.read_measurement
+        """
+        if not self.data_ready():
+            return None
+        return time.time(), self.read_measurement()
+
+    def stream(self, n=None, low_power=False, poll_interval=None, block=True):
+        """Start periodic measurement once and yield each new measurement.
+        Data ready is checked every poll_interval seconds, starting shortly
+        before the next measurement is due.  Measurement keeps running
+        after n measurements and is stopped when the generator is closed
+        or by self.close.
+
+        Parameters
+        ----------
+        n : int, number of measurements to yield before returning,
+            None to stream until the generator is closed
+        low_power : bool, if True use low power periodic measurement,
+            one measurement every 30 seconds instead of every 5
+        poll_interval : float, seconds between data ready checks,
+            defaults to 1/10 of the measurement period
+        block : bool, if False yield None instead of sleeping when no
+            data is ready, so a caller can run other sensors in between
+
+        Yields
+        ------
+        None if block is False and no data is ready, otherwise tuple of
+            t : float, seconds since the epoch when the data was read
+            data : list of co2, t and rh, see self.read_measurement
+        """
+        mode = 'low_power' if low_power else 'periodic'
+        if self.measuring != mode:
+            if self.measuring is not None:
+                self.close()
+            if low_power:
+                self.start_low_power_periodic_measurement()
+            else:
+                self.start_periodic_measurement()
+            self.measuring = mode
+        period = 30 if low_power else 5
+        if poll_interval is None:
+            poll_interval = period / 10
+
+        t_next = time.time()
+        yielded = 0
+        try:
+            while (n is None) or (yielded < n):
+                if time.time() >= t_next:
+                    record = self.poll()
+                    if record is not None:
+                        yield record
+                        yielded += 1
+                        # next measurement is due one period after this one
+                        t_next = record[0] + period - poll_interval
+                        continue
+                    t_next = time.time() + poll_interval
+                if block:
+                    time.sleep(max(0, t_next - time.time()))
+                else:
+                    yield None
+        except GeneratorExit:
+            self.close()
+            raise
+
+    def close(self):
+        """Stop periodic measurement if it was started by self.stream"""
+        if self.measuring is not None:
+            self.stop_periodic_measurement()
+            time.sleep(0.5)
 
     # On-chip output signal compensation, Ch 3.6
     def set_temperature_offset(self, tC):
@@ -171,13 +218,13 @@ class SCD4x():
 
         Returns
         -------
-        float, temperature offset in degrees Celsius
+        float, temperature offset in degrees Celsius, None if the CRC check failed
         """
         self.bus.write_n_bytes([0x23, 0x18])
         time.sleep(0.01)
-        d = self.bus.read_n_bytes(3)
-        d = CRC_check(d)
-        d = d[0] << 8 | d[1]
+        d = self._read_words(1)[0]
+        if d is None:
+            return None
         return (175 * d) / 2**16
 
     def set_sensor_altitude(self, meters):
@@ -194,13 +241,11 @@ class SCD4x():
 
         Returns
         -------
-        int, altitude in meters above sea level
+        int, altitude in meters above sea level, None if the CRC check failed
         """
         self.bus.write_n_bytes([0x23, 0x22])
         time.sleep(0.002)
-        d = self.bus.read_n_bytes(3)
-        d = CRC_check(d)
-        return d[0] << 8 | d[1]
+        return self._read_words(1)[0]
 
     def set_ambient_pressure(self, pressure):
         """Set ambient pressure to enable continuous pressure
@@ -230,14 +275,12 @@ class SCD4x():
         -------
         int, FRC correction in CO2 ppm
             or
-        None if FRC failed
+        None if FRC or the CRC check failed
         """
         self.bus.write_n_bytes([0x36, 0x2F])
         time.sleep(0.41)
-        d = self.bus.read_n_bytes(3)
-        d = CRC_check(d)
-        d = d[0] << 8 | d[1]
-        if d == 0xFFF:
+        d = self._read_words(1)[0]
+        if (d is None) or (d == 0xFFF):
             return None
         else:
             return d - 0x8000
@@ -264,13 +307,14 @@ class SCD4x():
 
         Returns
         -------
-        bool, True if ASC is enabled, False for disabled
+        bool, True if ASC is enabled, False for disabled,
+            None if the CRC check failed
         """
         self.bus.write_n_bytes([0x23, 0x13])
         time.sleep(0.002)
-        d = self.bus.read_n_bytes(3)
-        d = CRC_check(d)
-        d = d[0] << 8 | d[1]
+        d = self._read_words(1)[0]
+        if d is None:
+            return None
         if d == 0:
             return False
         else:
@@ -287,12 +331,13 @@ class SCD4x():
 
         Returns
         -------
-        bool, True if data is ready, otherwise False
+        bool, True if data is ready, otherwise False,
+            including when the CRC check failed
         """
         self.bus.write_n_bytes([0xE4, 0xB8])
-        d = self.bus.read_n_bytes(3)
-        d = CRC_check(d)
-        d = d[0] << 8 | d[1]
+        d = self._read_words(1)[0]
+        if d is None:
+            return False
         d = d & 0b11111111111
         if d == 0:
             return False
@@ -313,11 +358,9 @@ class SCD4x():
         verify presense of the sensor. See Ch 3.9.2"""
         self.bus.write_n_bytes([0x36, 0x82])
         time.sleep(0.01)
-        d = self.bus.read_n_bytes(9)
-        d = CRC_check(d)
-        da = []
-        for n in range(0, len(d), 2):
-            da.append(d[n] << 8 | d[n+1])
+        da = self._read_words(3)
+        if None in da:
+            return None
         return da[0] << 32 | da[1] << 16 | da[2]
 
     def perform_self_test(self):
@@ -325,9 +368,14 @@ class SCD4x():
         functionality and the power supply to the sensor. See Ch 3.9.3"""
         self.bus.write_n_bytes([0x36, 0x39])
         time.sleep(11)
-        d = self.bus.read_n_bytes(3)
-        d = CRC_check(d)
-        return d[0] << 8 | d[1]
+        return self._read_words(1)[0]
+
+    async def perform_self_test_async(self):
+        """Perform a self test, awaiting the 10 second test duration
+        instead of blocking. See self.perform_self_test"""
+        self.bus.write_n_bytes([0x36, 0x39])
+        await asyncio.sleep(11)
+        return self._read_words(1)[0]
 
     def perform_factory_reset(self):
         """Resets all configuration settings stored in EEPROM and
@@ -364,6 +412,23 @@ class SCD4x():
         return self.read_measurement()
 
 
+    async def measure_single_shot_async(self):
+        """On-demand measurement of CO2 concentration, relative humidity
+        and temperature, awaiting the 5 second measurement duration
+        instead of blocking. See Ch 3.10.1
+
+        Returns
+        -------
+        co2 : int, CO2 concentration in ppm
+        t : float, temperature in degrees Celsius
+        rh : int, relative humidity in percent
+        """
+        t0 = time.time()
+        self.bus.write_n_bytes([0x21, 0x9D])
+        await asyncio.sleep(5)  # 5000 ms
+        self.dt = time.time() - t0
+        return self.read_measurement()
+
     def read_measurement_blocking(self):
         """Read measurement from sensor. See Ch 3.5.2
 
@@ -453,3 +518,36 @@ class SCD4x():
             wr.write([self.sytem_id, self.sensor_id, self.description, m] + d)
             if delay is not None:
                 time.sleep(delay)
+
+    async def publish_async(self, description='NA', n=1, delay=None, blocking=True):
+        """Get measured air partical data and output in JSON, awaiting
+        measurement and delay times. See self.publish for parameters
+        and return values."""
+
+        data_list = []
+        for m in range(n):
+            if blocking:
+                d = await self.measure_single_shot_async()
+            else:
+                d = self.read_measurement()
+            data_list.append(self.json_writer.publish([self.system_id, self.sensor_id, description, m] + list(d)))
+            if n == 1:
+                return data_list[0]
+            if delay is not None:
+                await asyncio.sleep(delay)
+        return data_list
+
+    async def write_async(self, description='NA', n=1, delay=None, blocking=True):
+        """Get measured air partical data and save to file, awaiting
+        measurement and delay times. See self.write for parameters."""
+
+        wr = {"csv": self.csv_writer,
+              "json": self.json_writer}[self.writer_output]
+        for m in range(n):
+            if blocking:
+                d = await self.measure_single_shot_async()
+            else:
+                d = self.read_measurement()
+            wr.write([self.system_id, self.sensor_id, description, m] + list(d))
+            if delay is not None:
+                await asyncio.sleep(delay)
@@ -0,0 +1,127 @@
+"""Sensirion I2C protocol helpers shared by the SCD4x and SPS30 drivers
+
+Sensirion sensors send data in 3 byte words, 2 data bytes followed by a
+CRC8 (polynomial 0x31, initial value 0xFF) of those 2 bytes.
+See SCD4x datasheet ch 3.11 or SPS30 datasheet ch 6.2
+"""
+
+
+def _crc8_table():
+    table = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            if crc & 0x80:
+                crc = (crc << 1) ^ 0x31
+            else:
+                crc = crc << 1
+        table[i] = crc & 0xFF
+    return bytes(table)
+
+
+# CRC8 of one byte with a zero initial value, indexed by byte
+CRC8_TABLE = _crc8_table()
+
+# CRC8 of the first byte of a word, with the 0xFF initial value applied
+_CRC8_FIRST = bytes([CRC8_TABLE[0xFF ^ i] for i in range(256)])
+
+
+def crc8(data):
+    """Sensirion CRC8 checksum
+
+    Parameters
+    ----------
+    data : sequence of bytes, usually the 2 data bytes of one word
+
+    Returns
+    -------
+    int, CRC checksum
+    """
+    crc = 0xFF
+    for b in data:
+        crc = CRC8_TABLE[crc ^ b]
+    return crc
+
+
+def check_frame(data):
+    """Check the CRC of every word in a read buffer and strip the CRC
+    bytes.  Bytes after the last whole word are ignored.
+
+    Parameters
+    ----------
+    data : bytes, 3 per word where bytes 0 and 1 are data and byte 2
+        is the CRC checksum
+
+    Returns
+    -------
+    payload : memoryview, 2 data bytes per word, including words that
+        failed the check
+    failed : list of int, index of each word that failed the check
+    """
+    n = len(data) // 3
+    data = bytes(data[:3*n])
+    hi = data[0::3]
+    lo = data[1::3]
+    crc = data[2::3]
+    try:
+        # CRCs of all words at once: table lookup of the first bytes,
+        # xor with the second bytes as one integer, then a second lookup
+        x = int.from_bytes(hi.translate(_CRC8_FIRST), 'big') ^ int.from_bytes(lo, 'big')
+        calc = x.to_bytes(n, 'big').translate(CRC8_TABLE)
+        payload = bytearray(2*n)
+        payload[0::2] = hi
+        payload[1::2] = lo
+    except (AttributeError, NotImplementedError, TypeError):
+        # MicroPython has no bytes.translate or extended slice assignment
+        calc = bytes([CRC8_TABLE[_CRC8_FIRST[hi[i]] ^ lo[i]] for i in range(n)])
+        payload = bytearray(2*n)
+        for i in range(n):
+            payload[2*i] = hi[i]
+            payload[2*i+1] = lo[i]
+    if calc == crc:
+        failed = []
+    else:
+        failed = [i for i in range(n) if calc[i] != crc[i]]
+    return memoryview(payload), failed
+
+
+def CRC_calc(data):
+    """Sensirion CRC checksum for a 2 byte word, see crc8
+
+    Parameters
+    ----------
+    data : sequence of 2 bytes
+
+    Returns
+    -------
+    int, CRC check sum
+    """
+    return CRC8_TABLE[_CRC8_FIRST[data[0]] ^ data[1]]
+
+
+def CRC_check(data, verbose=False):
+    """Check the CRC of every word in data and return the data bytes
+    up to the first word that failed.  Use check_frame to get every
+    word and the index of each failed word.
+
+    Parameters
+    ----------
+    data : sequence of data, 3 per data value where
+        bytes 0 and 1 are data
+        byte 2 is the CRC checksum bytes
+    verbose : bool, print the index of each failed word
+
+    Returns
+    -------
+    memoryview of data bytes with checksum removed
+    or
+    None if data is empty
+    """
+    if len(data) == 0:
+        return None
+    payload, failed = check_frame(data)
+    if len(failed) == 0:
+        return payload
+    if verbose:
+        print('CRC failed for words:', failed)
+    return payload[:2*failed[0]]
@@ -6,69 +6,25 @@ such as TI ISO1540. Sensor will run on 3.3v but will produce inaccurate data.
 
 2021 Colin Dietrich"""
 
-from meerkat.base import time
+from meerkat.base import time, asyncio
 from meerkat.data import Meta, CSVWriter, JSONWriter
+from meerkat.driver.sensirion import CRC_calc, CRC_check, check_frame
 
 import struct
 
 
-def CRC_calc(data):
-    """Sensirion Common CRC checksum for 2-byte packets. See ch 6.2
-
-    Parameters
-    ----------
-    data : sequence of 2 bytes
-
-    Returns
-    -------
-    int, CRC check sum
-    """
-    crc = 0xFF
-    for i in range (0, 2):
-        crc = crc ^ data[i]
-        for j in range(8, 0, -1):
-            if crc & 0x80:
-                crc = (crc << 1) ^ 0x31
-            else:
-                crc = crc << 1
-    crc = crc & 0x0000FF
-    return crc
-
-def CRC_check(data, verbose=False):
-    """Apply the Sensirion Common CRC checksum for 2-byte packets
-    to a byte array. Check that all values received are uncorrupted
-    by matching the CRC checksum byte (third after 2 data bytes) and
-    returning the data bytes.
-
-    Parameters
-    ----------
-    data : sequence of data, 3 per data value where
-        bytes 0 and 1 are data
-        byte 2 is the CRC checksum bytes
-
-    Returns
-    -------
-    sequence of data values with checksum removed
-    or
-    None if sequence is corrupt and does not match checksum
-    """
-    d_len = len(data)
-    if d_len == 0:
-        return None
-    d = []
-    for i in range(2, d_len, 3):
-        crc = data[i]
-        n0 = data[i-2]
-        n1 = data[i-1]
-        crc_calc = CRC_calc([n0, n1])
-        if verbose:
-            print('crc:', crc, 'crc_calc:', crc_calc)
-        if (crc_calc == crc):
-            d.append(n0)
-            d.append(n1)
-        else:
-            return d
-    return d
+# measured values, 10 per read, see ch 4.3
+try:
+    _unpack_float = struct.Struct('>10f').unpack_from
+    _unpack_int = struct.Struct('>10H').unpack_from
+except AttributeError:
+    # MicroPython struct has no Struct class
+    def _unpack_float(d):
+        return struct.unpack('>10f', d)
+
+    def _unpack_int(d):
+        return struct.unpack('>10H', d)
+
 
 def ascii_check(ordinal):
     if (ordinal > 31) & (ordinal < 127):
@@ -106,7 +62,7 @@ class SPS30():
         self.metadata.description = 'SPS30 Particulate Matter Sensor'
         self.metadata.urls = 'https://www.sensirion.com/en/environmental-sensors/particulate-matter-sensors-pm25'
         self.metadata.manufacturer = 'Sensirion'
-        self.metadata.bus_n = bus_n
+        self.metadata.bus_n = getattr(i2c_bus, 'bus_n', None)
         self.metadata.bus_addr = hex(bus_addr)
         self.metadata.speed_warning = 0
         self.metadata.laser_error = 0
@@ -120,9 +76,15 @@ class SPS30():
         self.blocking_settle_dt = 15  # seconds
         self.blocking_timeout   = 30  # seconds
 
+        # count of measured value words that failed the CRC check
+        self.crc_failures = 0
+
+        # True while measurement is running for self.stream
+        self.measuring = False
+
         self.writer_output = output
-        self.csv_writer = CSVWriter(metadata=self.metadata, time_source='std_time_ms')
-        self.json_writer = JSONWriter(metadata=self.metadata, time_source='std_time_ms')
+        self.csv_writer = CSVWriter(metadata=self.metadata, time_source='local')
+        self.json_writer = JSONWriter(metadata=self.metadata, time_source='local')
 
     def set_format(self, output_format):
         """Set output format to either float or integer.
@@ -171,6 +133,51 @@ class SPS30():
     def stop_measurement(self):
         """Stop measurement. See ch 6.3.2"""
         self.bus.write_n_bytes([0x01, 0x04])
+        self.measuring = False
+
+    def stream(self, n=None, poll_interval=0.2):
+        """Start measurement once and yield each new record as the sensor
+        produces it, about once per second.  Measurement keeps running
+        between records, and after n records so the next call continues
+        without restarting the fan.  It is stopped when the generator is
+        closed, when an exception such as the data ready timeout is raised,
+        or by self.close.
+
+        Parameters
+        ----------
+        n : int, number of records to yield before returning,
+            None to stream until the generator is closed
+        poll_interval : float, seconds to wait between data ready checks
+
+        Yields
+        ------
+        list of 10 values, see self.measured_values
+        """
+        if not self.measuring:
+            self.start_measurement()
+            self.measuring = True
+        try:
+            yielded = 0
+            t0 = time.time()
+            while (n is None) or (yielded < n):
+                if self.data_ready():
+                    yield self.measured_values(ready=True)
+                    yielded += 1
+                    t0 = time.time()
+                elif time.time() - t0 > self.blocking_timeout:
+                    raise OSError('SPS30 data not ready after %s seconds' % self.blocking_timeout)
+                else:
+                    time.sleep(poll_interval)
+        except BaseException:
+            # GeneratorExit, the data ready timeout or a bus error,
+            # stop the fan before passing it on
+            self.close()
+            raise
+
+    def close(self):
+        """Stop measurement if it was started by self.stream"""
+        if self.measuring:
+            self.stop_measurement()
 
     def data_ready(self):
         """Read Data-Ready Flag. See ch 6.3.3
@@ -181,6 +188,16 @@ class SPS30():
         """
         self.bus.write_n_bytes([0x02, 0x02])
         time.sleep(0.1)
+        return self._read_data_ready()
+
+    async def data_ready_async(self):
+        """Read Data-Ready Flag, awaiting the read delay. See self.data_ready"""
+        self.bus.write_n_bytes([0x02, 0x02])
+        await asyncio.sleep(0.1)
+        return self._read_data_ready()
+
+    def _read_data_ready(self):
+        """Read and decode the Data-Ready Flag reply"""
         d = self.bus.read_n_bytes(3)
         d = CRC_check(d)
         if (d is None) or (d[1] == 0x00):
@@ -204,41 +221,84 @@ class SPS30():
         t0 = time.time()
         while (time.time() - t0 < self.blocking_timeout):
             if self.data_ready():
+                d = self.measured_values(ready=True)
+                self.stop_measurement()
+                return d
+            if verbose:
+                print('waiting...')
+        return False
+
+    async def measured_values_blocking_async(self, verbose=False):
+        """Await and poll until new data is available, without blocking
+        other tasks. See self.measured_values_blocking
+
+        Parameters
+        ----------
+        verbose : bool, print debug statements
+        """
+        self.start_measurement()
+        await asyncio.sleep(self.blocking_settle_dt)
+
+        t0 = time.time()
+        while (time.time() - t0 < self.blocking_timeout):
+            if await self.data_ready_async():
+                d = self._read_measured_values()
                 self.stop_measurement()
-                return self.measured_values()
+                return d
             if verbose:
                 print('waiting...')
         return False
 
-    def measured_values(self, return_bytes=False):
+    def measured_values(self, return_bytes=False, ready=False):
         """Read measured values. See ch 6.3.4 for I2C method
         and ch 4.3 for format
 
         Parameters
         ----------
         bytes : bool, return bytes without CRC check or unpacking
+        ready : bool, if True data_ready has already returned True so
+            read without waiting for the measurement to settle
         """
-        byte_number = {'int': 30, 'float': 60}[self.output_format]
-        self.bus.write_n_bytes([0x03, 0x00])
+        if not ready:
+            # sleep long enough for the measurement and/or settling
+            time.sleep(self.blocking_settle_dt + 0.1)
+        return self._read_measured_values(return_bytes)
+
+    async def measured_values_async(self, return_bytes=False):
+        """Read measured values, awaiting the settle time.
+        See self.measured_values"""
+        await asyncio.sleep(self.blocking_settle_dt + 0.1)
+        return self._read_measured_values(return_bytes)
 
-        # sleep long enough for the measurement and/or settling
-        time.sleep(self.blocking_settle_dt + 0.1)
+    def _read_measured_values(self, return_bytes=False):
+        """Read and decode measured values without waiting. See ch 6.3.4
+        for I2C method and ch 4.3 for format
 
+        Parameters
+        ----------
+        bytes : bool, return bytes without CRC check or unpacking
+
+        Returns
+        -------
+        list of 10 values, a value is None if its CRC check failed
+        """
+        byte_number = {'int': 30, 'float': 60}[self.output_format]
+        self.bus.write_n_bytes([0x03, 0x00])
         d = self.bus.read_n_bytes(byte_number)
         if return_bytes:
             return d
-        d = CRC_check(d)
+        d, failed = check_frame(d)
         if self.output_format == 'float':
-            d_f = []
-            for n in range(0, len(d), 4):
-                d_f.append(struct.unpack('>f', bytes(d[n:n+4]))[0])
-            d_f = [round(n, 2) for n in d_f]
-            return d_f
-        elif self.output_format == 'int':
-            d_i = []
-            for n in range(0, len(d), 2):
-                d_i.append(struct.unpack('>h', bytes(d[n:n+2]))[0])
-            return d_i
+            d = [round(v, 2) for v in _unpack_float(d)]
+            words = 2
+        else:
+            d = list(_unpack_int(d))
+            words = 1
+        if len(failed) > 0:
+            self.crc_failures += len(failed)
+            for w in failed:
+                d[w // words] = None
+        return d
     '''
     Features disabled due to I2C bus errors sending wake command
 
@@ -390,3 +450,39 @@ class SPS30():
             wr.write([self.system_id, self.sensor_id, description, m] + get())
             if delay is not None:
                 time.sleep(delay)
+
+    async def publish_async(self, description='NA', n=1, delay=None, blocking=True):
+        """Get measured air partical data and output in JSON, awaiting
+        settle and delay times. See self.publish for parameters and
+        return values."""
+
+        if blocking:
+            get = self.measured_values_blocking_async
+        else:
+            get = self.measured_values_async
+
+        data_list = []
+        for m in range(n):
+            _data = self.json_writer.publish([self.system_id, self.sensor_id, description, m] + await get())
+            data_list.append(_data)
+            if n == 1:
+                return data_list[0]
+            if delay is not None:
+                await asyncio.sleep(delay)
+        return data_list
+
+    async def write_async(self, description='NA', n=1, delay=None, blocking=True):
+        """Get measured air partical data and save to file, awaiting
+        settle and delay times. See self.write for parameters."""
+
+        if blocking:
+            get = self.measured_values_blocking_async
+        else:
+            get = self.measured_values_async
+
+        wr = {"csv": self.csv_writer,
+              "json": self.json_writer}[self.writer_output]
+        for m in range(n):
+            wr.write([self.system_id, self.sensor_id, description, m] + await get())
+            if delay is not None:
+                await asyncio.sleep(delay)
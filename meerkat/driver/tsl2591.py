@@ -68,7 +68,7 @@ class TSL2591:
         self.b   = None
 
         # information about this device
-        self.metadata = Meta(name=name)
+        self.metadata = Meta(name=sensor_id)
         self.metadata.description = 'Dual channel 16bit photodiode light-to-digital converter'
         self.metadata.urls = 'https://ams.com/tsl25911'
         self.metadata.manufacturer = 'AMS (formerly TAOS)'